@@ -2,6 +2,9 @@ from fabric.contrib.files import exists
 from fabric.api import env, local, run, put
 
 REPO_URL = 'https://github.com/MicrobesNG/mngweb'
+# Commands run on the server use the production settings, like gunicorn
+MANAGE = ('DJANGO_SETTINGS_MODULE=mngweb.settings.production '
+          '../venv/bin/python3 manage.py')
 
 
 def deploy():
@@ -15,20 +18,22 @@ def deploy():
     _update_static_files(source_folder)
     _update_database(source_folder)
     #_update_organisations(source_folder)
+    _update_typeahead_prefetch(source_folder)
     _restart_gunicorn(env.host)
+    _restart_samplesheet_worker(env.host)
     _restart_nginx()
 
 
 def update_portal_sample_sheet():
     site_folder = '/home/%s/sites/%s' % (env.user, env.host)
     source_folder = site_folder + '/source'
-    run('cd %s && ../venv/bin/python3 manage.py updatesamplesheet' % (
-        source_folder,
+    run('cd %s && %s updatesamplesheet' % (
+        source_folder, MANAGE,
     ))
 
 
 def _create_directory_structure(site_folder):
-    for subfolder in ('database', 'static', 'media', 'venv'):
+    for subfolder in ('cache', 'database', 'static', 'media', 'venv'):
         run('mkdir -p %s/%s' % (site_folder, subfolder))
 
 
@@ -57,20 +62,26 @@ def _copy_local_settings(local_source_folder, source_folder):
 
 
 def _update_static_files(source_folder):
-    run('cd %s && ../venv/bin/python3 manage.py collectstatic --noinput' % (
-        source_folder,
+    run('cd %s && %s collectstatic --noinput' % (
+        source_folder, MANAGE,
     ))
 
 
 def _update_database(source_folder):
-    run('cd %s && ../venv/bin/python3 manage.py migrate --noinput' % (
-        source_folder,
+    run('cd %s && %s migrate --noinput' % (
+        source_folder, MANAGE,
     ))
 
 
 def _update_organisations(source_folder):
-    run('cd %s && ../venv/bin/python3 manage.py updateorganisations' % (
-        source_folder,
+    run('cd %s && %s updateorganisations' % (
+        source_folder, MANAGE,
+    ))
+
+
+def _update_typeahead_prefetch(source_folder):
+    run('cd %s && %s writetypeaheadprefetch' % (
+        source_folder, MANAGE,
     ))
 
 
@@ -78,5 +89,9 @@ def _restart_gunicorn(site_name):
     run('sudo systemctl restart gunicorn-%s' % (site_name,))
 
 
+def _restart_samplesheet_worker(site_name):
+    run('sudo systemctl restart samplesheet-worker-%s' % (site_name,))
+
+
 def _restart_nginx():
     run('sudo service nginx reload')
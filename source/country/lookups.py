@@ -0,0 +1,5 @@
+from mngweb.lookups import LookupTable
+from .models import Country
+
+
+countries = LookupTable(Country, 'countries')
@@ -3,10 +3,16 @@
 
   var typeahead = mngweb.typeahead || {};
 
+  // URL of a dataset's static prefetch file, or of its view if none has
+  // been written yet
+  typeahead.prefetchUrl = function (name, fallback) {
+    return (mngweb.typeaheadPrefetch || {})[name] || fallback;
+  };
+
   typeahead.countries = new Bloodhound({
     datumTokenizer: Bloodhound.tokenizers.whitespace,
     queryTokenizer: Bloodhound.tokenizers.whitespace,
-    prefetch: '/country/typeahead/'
+    prefetch: typeahead.prefetchUrl('countries', '/country/typeahead/')
   });
 
   typeahead.countriesShowAllOnEmpty = function (q, sync) {
@@ -17,13 +23,9 @@
     }
   };
 
-  mngweb.typeahead = typeahead;
-
-  /*
-  jQuery document ready:
-  */
-  $(document).ready(function () {
-    $('.country-typeahead input').typeahead({
+  // Also called for forms loaded after the page, e.g. the projectline editor
+  typeahead.initCountryTypeaheads = function (context) {
+    $(context).find('.country-typeahead input').typeahead({
       hint: true,
       highlight: true,
       minLength: 0
@@ -33,6 +35,15 @@
       source: mngweb.typeahead.countriesShowAllOnEmpty,
       limit: 300
     });
+  };
+
+  mngweb.typeahead = typeahead;
+
+  /*
+  jQuery document ready:
+  */
+  $(document).ready(function () {
+    typeahead.initCountryTypeaheads(document);
   });
 
 })(window.mngweb = window.mngweb || {}, jQuery);
\ No newline at end of file
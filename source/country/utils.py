@@ -1,6 +1,9 @@
 from django.utils import timezone
 
+from mngweb.caching import bump_dataset_version
+from mngweb.prefetch import write_prefetch
 from portal.services import limsfm_get_countries
+from .lookups import countries as country_lookup
 from .models import Country
 
 
@@ -34,6 +37,13 @@ def update_countries():
     delete_set = Country.objects.filter(updated__lt=start_time)
     deleted_count = len(delete_set)
     delete_set.delete()
+    bump_dataset_version(country_lookup.dataset)
+    write_countries_prefetch()
 
     print("Countries update completed. %d created, %d updated, %d deleted." %
           (created_count, updated_count, deleted_count))
+
+
+def write_countries_prefetch():
+    """write the country typeahead prefetch file"""
+    write_prefetch('countries', Country.objects.values_list('name', flat=True))
@@ -1,15 +1,14 @@
-from django.http import JsonResponse
-
+from mngweb.typeahead import (TypeaheadIndex, typeahead_cache,
+                              typeahead_response)
+from .lookups import countries
 from .models import Country
 
 
+country_index = TypeaheadIndex(
+    countries.dataset,
+    lambda: Country.objects.values_list('name', flat=True))
+
+
+@typeahead_cache(country_index)
 def country_typeahead(request):
-    q = request.GET.get('q', '')
-    if q:
-        matches = (Country.objects
-                   .filter(name__icontains=q)
-                   .values_list('name', flat=True)[:10])
-    else:
-        matches = Country.objects.all().values_list('name', flat=True)
-    data = list(matches)
-    return JsonResponse(data, safe=False)
+    return typeahead_response(request, country_index)
@@ -1,12 +1,14 @@
 import datetime
-import requests
+import json
 
 from django import template
 from django.conf import settings
-from django.core.cache import cache
-from django.utils.http import urlquote
+from django.utils.safestring import mark_safe
 from statistics import median_low
 
+from mngweb.caching import cached_computation
+from mngweb.prefetch import prefetch_urls
+
 from ..models import NavigationMenu, ServicePrice, Testimonial,\
     PeoplePagePerson, PERSON_TEAM_CHOICES
 from portal.services import limsfm_request
@@ -19,13 +21,16 @@ register = template.Library()
 
 def update_lims_sample_stats():
     # find samples with related strain aliquot
-    url = (settings.RESTFM_BASE_URL +
-           'layout/sample_api.json?RFMkey=' +
-           settings.RESTFM_KEY +
-           '&RFMsF1=Aliquot%3A%3Aaliquottype_id&RFMsV1=%3D%3D2' +
-           '&RFMmax=1')
     try:
-        response = requests.get(url, timeout=3)
+        response = limsfm_request(
+            'layout/sample_api',
+            'get',
+            {
+                'RFMmax': 1,
+                'RFMsF1': 'Aliquot::aliquottype_id',
+                'RFMsV1': '==2',
+            },
+            timeout=3)
         if response.status_code == 200:
             sample_stats = {}
             sample_stats['strain_count'] = int(
@@ -70,18 +75,18 @@ def update_lims_project_stats():
 
 @register.assignment_tag(takes_context=False)
 def get_lims_sample_stats():
-    return cache.get_or_set(
+    return cached_computation(
         'lims_sample_stats',
-        update_lims_sample_stats(),
+        update_lims_sample_stats,
         settings.LIMS_STATS_CACHE_TIMEOUT
     )
 
 
 @register.assignment_tag(takes_context=False)
 def get_lims_project_stats():
-    return cache.get_or_set(
+    return cached_computation(
         'lims_project_stats',
-        update_lims_project_stats(),
+        update_lims_project_stats,
         settings.LIMS_STATS_CACHE_TIMEOUT
     )
 
@@ -98,6 +103,15 @@ def get_navigation_menu(menu_name):
         return None
 
 
+# Typeahead prefetch file URLs, as a javascript object literal
+
+@register.simple_tag(takes_context=False)
+def typeahead_prefetch_urls():
+    urls = json.dumps(prefetch_urls(), sort_keys=True)
+    return mark_safe(urls.replace('<', '\\u003c').replace('>', '\\u003e')
+                     .replace('&', '\\u0026'))
+
+
 # Person feed by team
 
 @register.simple_tag(takes_context=False)
@@ -0,0 +1,220 @@
+"""SQLite-backed cache shared by every worker process on a host.
+
+Unlike LocMemCache, one SQLite file (in WAL mode) is visible to all gunicorn
+workers, so LIMS/EBI results are fetched and warmed once per host rather than
+once per worker, without running an external cache service. Supports atomic
+add/incr, per-key timeouts, LRU eviction bounded by MAX_ENTRIES, and hit/miss
+counters (see SQLiteCache.stats). Entries set with timeout=None (e.g. dataset
+versions) never expire and are never culled, nor counted towards MAX_ENTRIES.
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'mngweb.cache_backends.SQLiteCache',
+            'LOCATION': '/path/to/cache.sqlite3',
+            'OPTIONS': {'MAX_ENTRIES': 20000, 'CULL_FREQUENCY': 4},
+        }
+    }
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS cache_entry (
+           key TEXT PRIMARY KEY,
+           value BLOB NOT NULL,
+           expires REAL,
+           accessed REAL NOT NULL)""",
+    """CREATE INDEX IF NOT EXISTS cache_entry_accessed
+           ON cache_entry (accessed)""",
+    """CREATE TABLE IF NOT EXISTS cache_stats (
+           name TEXT PRIMARY KEY,
+           count INTEGER NOT NULL)""",
+    """INSERT OR IGNORE INTO cache_stats (name, count) VALUES ('hits', 0)""",
+    """INSERT OR IGNORE INTO cache_stats (name, count) VALUES ('misses', 0)""",
+]
+
+ACCESS_RESOLUTION = 1.0  # seconds; coarser LRU stamps mean fewer writes
+STATS_FLUSH_INTERVAL = 10.0  # seconds between writes of hit/miss counters
+CULL_CHECK_INTERVAL = 50  # writes (per process) between entry counts
+
+
+class SQLiteCache(BaseCache):
+
+    def __init__(self, location, params):
+        super(SQLiteCache, self).__init__(params)
+        self._path = os.path.abspath(location)
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._pending = {'hits': 0, 'misses': 0}
+        self._stats_flushed = time.time()
+        self._writes = 0
+
+    # Connections are per thread, and re-opened after a fork
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self._path)
+            if not os.path.isdir(directory):
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(
+                self._path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                conn.execute(statement)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    # Stats
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._pending[name] += 1
+            due = time.time() - self._stats_flushed >= STATS_FLUSH_INTERVAL
+        if due:
+            self._flush_stats()
+
+    def _flush_stats(self):
+        with self._stats_lock:
+            pending, self._pending = self._pending, {'hits': 0, 'misses': 0}
+            self._stats_flushed = time.time()
+        conn = self._connection()
+        for name, count in pending.items():
+            if count:
+                conn.execute(
+                    'UPDATE cache_stats SET count = count + ? WHERE name = ?',
+                    (count, name))
+
+    def stats(self):
+        """Return hit/miss counters (all workers) and the entry count"""
+        self._flush_stats()
+        conn = self._connection()
+        stats = dict(conn.execute('SELECT name, count FROM cache_stats'))
+        stats['entries'] = conn.execute(
+            'SELECT COUNT(*) FROM cache_entry').fetchone()[0]
+        return stats
+
+    # Cache API
+
+    def _get_row(self, conn, key, now):
+        row = conn.execute(
+            'SELECT value, expires, accessed FROM cache_entry WHERE key = ?',
+            (key,)).fetchone()
+        if row is not None and row[1] is not None and row[1] <= now:
+            return None
+        return row
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        conn = self._connection()
+        now = time.time()
+        row = self._get_row(conn, key, now)
+        if row is None:
+            self._count('misses')
+            return default
+        self._count('hits')
+        if now - row[2] >= ACCESS_RESOLUTION:
+            conn.execute('UPDATE cache_entry SET accessed = ? WHERE key = ?',
+                         (now, key))
+        return pickle.loads(row[0])
+
+    def _store(self, conn, key, value, expires, now):
+        conn.execute(
+            'INSERT OR REPLACE INTO cache_entry (key, value, expires, accessed)'
+            ' VALUES (?, ?, ?, ?)',
+            (key, sqlite3.Binary(pickle.dumps(value, pickle.HIGHEST_PROTOCOL)),
+             expires, now))
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        conn = self._connection()
+        self._store(conn, key, value, self.get_backend_timeout(timeout),
+                    time.time())
+        self._cull(conn)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        conn = self._connection()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            exists = self._get_row(conn, key, now) is not None
+            if not exists:
+                self._store(conn, key, value,
+                            self.get_backend_timeout(timeout), now)
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        if exists:
+            return False
+        self._cull(conn)
+        return True
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        conn = self._connection()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = self._get_row(conn, key, now)
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(row[0]) + delta
+            self._store(conn, key, value, row[1], now)
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        return value
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._get_row(self._connection(), key, time.time()) is not None
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._connection().execute(
+            'DELETE FROM cache_entry WHERE key = ?', (key,))
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache_entry')
+
+    def _expiring_count(self, conn):
+        return conn.execute('SELECT COUNT(*) FROM cache_entry '
+                            'WHERE expires IS NOT NULL').fetchone()[0]
+
+    def _cull(self, conn):
+        # Counting entries scans the table, so only every so many writes
+        self._writes += 1
+        if self._writes % CULL_CHECK_INTERVAL:
+            return
+        if self._expiring_count(conn) <= self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            conn.execute('DELETE FROM cache_entry WHERE expires IS NOT NULL')
+            return
+        conn.execute('DELETE FROM cache_entry WHERE expires <= ?',
+                     (time.time(),))
+        count = self._expiring_count(conn)
+        if count > self._max_entries:
+            # Evict the least recently used 1/CULL_FREQUENCY of entries
+            cull_num = max(count // self._cull_frequency, 1)
+            conn.execute(
+                'DELETE FROM cache_entry WHERE key IN ('
+                'SELECT key FROM cache_entry WHERE expires IS NOT NULL '
+                'ORDER BY accessed LIMIT ?)', (cull_num,))
@@ -0,0 +1,191 @@
+"""Lazily computed, shared cache values.
+
+Use cached_computation() rather than cache.get_or_set(key, expensive(), ...):
+get_or_set evaluates its default on every call, even when the key is cached.
+
+Dataset versions let processes that keep their own copy of some database
+data (see mngweb.lookups) notice when a loader has changed it.
+
+LocalLRUCache and coalesce() serve hot, per-process lookups (e.g. proxied
+searches) in front of the shared cache.
+"""
+import datetime
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from django.core.cache import cache
+
+
+logger = logging.getLogger(__name__)
+
+LOCK_TIMEOUT = 60  # seconds a worker may hold a recompute lock
+LOCK_WAIT = 5  # seconds to wait for another worker computing a missing key
+
+
+def _lock_key(key):
+    return '{}__lock'.format(key)
+
+
+def _compute(key, func, timeout, stale_timeout):
+    value = func()
+    cache.set(key, (value, time.time() + timeout), timeout + stale_timeout)
+    return value
+
+
+def _refresh(key, func, timeout, stale_timeout):
+    try:
+        _compute(key, func, timeout, stale_timeout)
+    except Exception:
+        logger.exception("Background refresh of cache key %s failed", key)
+    finally:
+        cache.delete(_lock_key(key))
+
+
+def cached_computation(key, func, timeout, stale_timeout=None):
+    """
+    Return the cached result of func(), calling it only when needed.
+
+    A value is fresh for `timeout` seconds and is then served stale for up
+    to `stale_timeout` more seconds (default: `timeout`) while one worker
+    recomputes it in a background thread. A lock held in the cache ensures
+    only one worker recomputes a key at a time. When there is no value at
+    all, func() runs in the calling thread and any exception it raises
+    propagates (nothing is cached).
+    """
+    if stale_timeout is None:
+        stale_timeout = timeout
+
+    entry = cache.get(key)
+    if entry is not None:
+        value, fresh_until = entry
+        if (time.time() >= fresh_until and
+                cache.add(_lock_key(key), True, LOCK_TIMEOUT)):
+            threading.Thread(
+                target=_refresh, args=(key, func, timeout, stale_timeout),
+                daemon=True).start()
+        return value
+
+    if not cache.add(_lock_key(key), True, LOCK_TIMEOUT):
+        # Another worker is computing this key; give it a moment
+        deadline = time.time() + LOCK_WAIT
+        while time.time() < deadline:
+            time.sleep(0.1)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry[0]
+        return _compute(key, func, timeout, stale_timeout)
+
+    try:
+        return _compute(key, func, timeout, stale_timeout)
+    finally:
+        cache.delete(_lock_key(key))
+
+
+def get_cached_values(keys):
+    """Return {key: value} for the keys cached by cached_computation(),
+       fresh or stale"""
+    return {k: entry[0] for k, entry in cache.get_many(keys).items()}
+
+
+def set_cached_values(values, timeout, stale_timeout=None):
+    """Seed cached_computation() keys with values computed elsewhere, e.g.
+       by a batched lookup"""
+    if stale_timeout is None:
+        stale_timeout = timeout
+    fresh_until = time.time() + timeout
+    cache.set_many({k: (v, fresh_until) for k, v in values.items()},
+                   timeout + stale_timeout)
+
+
+def _dataset_version_key(name):
+    return 'dataset_version_{}'.format(name)
+
+
+def _new_dataset_version():
+    return '{:d}.{}'.format(int(time.time()), uuid.uuid4().hex)
+
+
+def get_dataset_version(name):
+    """Return the current version token of a named dataset, or None if it
+       has not been bumped since the shared cache was created"""
+    return cache.get(_dataset_version_key(name))
+
+
+def bump_dataset_version(name):
+    """Mark a named dataset as changed, so that every process holding a
+       copy of it reloads that copy"""
+    cache.set(_dataset_version_key(name), _new_dataset_version(), None)
+
+
+def dataset_version_datetime(version):
+    """Return the (naive UTC) time a dataset version was created, or None
+       for a version token without one"""
+    try:
+        timestamp = int(version.split('.', 1)[0])
+    except (AttributeError, ValueError):
+        return None
+    return datetime.datetime.utcfromtimestamp(timestamp)
+
+
+class LocalLRUCache(object):
+    """A thread-safe, in-process cache of at most maxsize values, each kept
+       for timeout seconds; the least recently used values are evicted
+       first"""
+
+    def __init__(self, maxsize, timeout):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires = entry
+            if time.time() >= expires:
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.time() + self.timeout)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def coalesce(key, func):
+    """Return func(), sharing a single call among threads asking for the
+       same key at the same time: the first calls func, the others wait
+       for its result (or exception)"""
+    with _inflight_lock:
+        future = _inflight.get(key)
+        owner = future is None
+        if owner:
+            future = _inflight[key] = Future()
+    if not owner:
+        return future.result()
+    try:
+        future.set_result(func())
+    except Exception as e:
+        future.set_exception(e)
+    finally:
+        with _inflight_lock:
+            del _inflight[key]
+    return future.result()
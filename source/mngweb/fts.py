@@ -0,0 +1,106 @@
+"""SQLite FTS5 shadow tables for name searches.
+
+A shadow table is an external-content FTS5 table over a model's table
+(named <table>_fts), kept in sync with it by triggers, so that bulk syncs,
+admin edits and raw SQL all update it. Migrations create shadow tables with
+create_shadow_table() where the database supports FTS5; search() then
+answers word-prefix queries ranked by bm25, and views fall back to other
+means of searching where shadow_table_exists() is False.
+"""
+import re
+
+from django.db import connection
+
+
+TOKEN = re.compile(r'\w+', re.UNICODE)
+
+_existing = {}
+
+
+def shadow_table(table):
+    return '{}_fts'.format(table)
+
+
+def fts5_available(cursor):
+    """Return True if the cursor's SQLite database supports FTS5"""
+    try:
+        cursor.execute('CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)')
+    except Exception:
+        return False
+    cursor.execute('DROP TABLE temp.fts5_probe')
+    return True
+
+
+def create_shadow_table(cursor, table, column='name', pk='id'):
+    """Create and populate the FTS5 shadow table of table.column, with the
+       triggers that keep it in sync"""
+    fts = shadow_table(table)
+    params = {'fts': fts, 'table': table, 'column': column, 'pk': pk}
+    for sql in [
+        'CREATE VIRTUAL TABLE {fts} USING fts5('
+        '{column}, content="{table}", content_rowid="{pk}")',
+        'CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN '
+        'INSERT INTO {fts}(rowid, {column}) VALUES (new.{pk}, new.{column}); '
+        'END',
+        'CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN '
+        'INSERT INTO {fts}({fts}, rowid, {column}) '
+        'VALUES (\'delete\', old.{pk}, old.{column}); END',
+        'CREATE TRIGGER {fts}_au AFTER UPDATE ON {table} BEGIN '
+        'INSERT INTO {fts}({fts}, rowid, {column}) '
+        'VALUES (\'delete\', old.{pk}, old.{column}); '
+        'INSERT INTO {fts}(rowid, {column}) VALUES (new.{pk}, new.{column}); '
+        'END',
+        'INSERT INTO {fts}({fts}) VALUES (\'rebuild\')',
+    ]:
+        cursor.execute(sql.format(**params))
+
+
+def drop_shadow_table(cursor, table):
+    fts = shadow_table(table)
+    for suffix in ['ai', 'ad', 'au']:
+        cursor.execute('DROP TRIGGER IF EXISTS {}_{}'.format(fts, suffix))
+    cursor.execute('DROP TABLE IF EXISTS {}'.format(fts))
+
+
+def shadow_table_exists(table):
+    """Return True if the default database has table's shadow table
+       (checked once per process)"""
+    if table not in _existing:
+        _existing[table] = False
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' "
+                    "AND name = %s", [shadow_table(table)])
+                _existing[table] = cursor.fetchone() is not None
+    return _existing[table]
+
+
+def match_query(q):
+    """Turn free text into an FTS5 query matching every word as a prefix,
+       or None if q has no words"""
+    tokens = TOKEN.findall(q)
+    if not tokens:
+        return None
+    return ' '.join('"{}"*'.format(t) for t in tokens)
+
+
+def search(cursor, table, q, limit, column='name', pk='id', where='',
+           params=(), placeholder='%s'):
+    """Return up to limit values of table.column matching q: those
+       starting with q first, then by bm25 rank. where (e.g.
+       'AND c.data_set IN (...)') filters the content table, aliased c.
+       placeholder is the cursor's parameter style ('?' for sqlite3)"""
+    match = match_query(q)
+    if match is None:
+        return []
+    sql = (
+        'SELECT c.{column} FROM {fts} JOIN {table} c ON c.{pk} = {fts}.rowid '
+        'WHERE {fts} MATCH {p} {where} '
+        'ORDER BY c.{column} LIKE {p} ESCAPE \'\\\' DESC, bm25({fts}), '
+        'c.{column} '
+        'LIMIT {p}').format(fts=shadow_table(table), table=table,
+                            column=column, pk=pk, where=where, p=placeholder)
+    prefix = re.sub(r'([\\%_])', r'\\\1', q.strip()) + '%'
+    cursor.execute(sql, [match] + list(params) + [prefix, limit])
+    return [row[0] for row in cursor.fetchall()]
@@ -0,0 +1,73 @@
+"""Process-level lookup tables for small, rarely changing models.
+
+A LookupTable holds every instance of a model in memory, keyed by a field,
+so that resolving names (e.g. in form fields) costs no queries. Tables are
+rebuilt when their dataset version (see mngweb.caching) changes; loaders
+that modify the data must call bump_dataset_version() with the table's
+dataset name.
+"""
+import threading
+import time
+
+from mngweb.caching import get_dataset_version
+
+
+VERSION_CHECK_INTERVAL = 10  # seconds between dataset version checks
+
+
+class VersionedData(object):
+    """Base for in-process copies of a dataset. Subclasses implement
+       build(), returning the data that data() then returns until the
+       dataset's version changes."""
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked = 0
+        self._data = None
+
+    def build(self):
+        raise NotImplementedError
+
+    def data(self):
+        if time.time() - self._checked >= VERSION_CHECK_INTERVAL:
+            with self._lock:
+                if time.time() - self._checked >= VERSION_CHECK_INTERVAL:
+                    version = get_dataset_version(self.dataset)
+                    if version != self._version or self._data is None:
+                        self._data = self.build()
+                        self._version = version
+                    self._checked = time.time()
+        return self._data
+
+    def version(self):
+        """Return the dataset version data() answers from (without building
+           the data if that has not happened yet)"""
+        if self._data is None:
+            return get_dataset_version(self.dataset)
+        self.data()
+        return self._version
+
+
+class LookupTable(VersionedData):
+
+    def __init__(self, model, dataset, field='name'):
+        super(LookupTable, self).__init__(dataset)
+        self.model = model
+        self.field = field
+
+    def build(self):
+        objects = list(self.model.objects.all())
+        by_key = {}
+        for obj in objects:
+            by_key.setdefault(str(getattr(obj, self.field)), obj)
+        return objects, by_key
+
+    def get(self, key):
+        """Return the instance whose field equals key, or None"""
+        return self.data()[1].get(str(key))
+
+    def all(self):
+        """Return every instance, in the model's default ordering"""
+        return self.data()[0]
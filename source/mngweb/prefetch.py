@@ -0,0 +1,95 @@
+"""Precomputed typeahead prefetch files.
+
+The sync commands write each typeahead dataset (a JSON list of names) into
+the static tree as <name>.<content hash>.json, alongside gzip (and, if the
+brotli package is installed, brotli) compressed copies for nginx to serve
+as they are. A manifest maps dataset names to their current file, and
+prefetch_urls() gives templates the current URLs, so the files can be
+cached forever and Django only answers the remote typeahead queries.
+"""
+import fcntl
+import gzip
+import hashlib
+import json
+import os
+import re
+
+from django.conf import settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+PREFETCH_DIR = getattr(settings, 'TYPEAHEAD_PREFETCH_DIR', 'typeahead')
+PREFETCH_ROOT = os.path.join(settings.STATIC_ROOT, PREFETCH_DIR)
+PREFETCH_URL = '{}{}/'.format(settings.STATIC_URL, PREFETCH_DIR)
+MANIFEST = os.path.join(PREFETCH_ROOT, 'manifest.json')
+HASH_LENGTH = 12
+
+_manifest = {'mtime': None, 'files': {}}
+
+
+def _write_file(path, content):
+    """Write content to path atomically"""
+    tmp_path = '{}.tmp'.format(path)
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def _read_manifest():
+    try:
+        with open(MANIFEST) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+
+def _remove_old_files(name, keep):
+    pattern = re.compile(r'^{}\.[0-9a-f]{{{}}}\.json(\.gz|\.br)?$'.format(
+        re.escape(name), HASH_LENGTH))
+    for filename in os.listdir(PREFETCH_ROOT):
+        if (pattern.match(filename) and
+                filename.split('.json')[0] + '.json' not in keep):
+            os.remove(os.path.join(PREFETCH_ROOT, filename))
+
+
+def write_prefetch(name, names):
+    """Write a prefetch file of names for dataset name and make it current.
+       The previous file is kept, for pages that still refer to it."""
+    content = json.dumps([str(n) for n in names],
+                         separators=(',', ':')).encode('utf-8')
+    digest = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+    filename = '{}.{}.json'.format(name, digest)
+    path = os.path.join(PREFETCH_ROOT, filename)
+
+    os.makedirs(PREFETCH_ROOT, exist_ok=True)
+    _write_file(path, content)
+    _write_file(path + '.gz', gzip.compress(content, compresslevel=9))
+    if brotli is not None:
+        _write_file(path + '.br', brotli.compress(content))
+
+    # Serialise manifest updates between concurrent sync commands
+    with open(MANIFEST + '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        manifest = _read_manifest()
+        keep = {filename, manifest.get(name)}
+        manifest[name] = filename
+        _write_file(MANIFEST, json.dumps(manifest, indent=2).encode('utf-8'))
+        _remove_old_files(name, keep)
+    return filename
+
+
+def prefetch_urls():
+    """Return {dataset name: URL of its current prefetch file}"""
+    try:
+        mtime = os.stat(MANIFEST).st_mtime
+    except OSError:
+        return {}
+    if mtime != _manifest['mtime']:
+        _manifest['files'] = _read_manifest()
+        _manifest['mtime'] = mtime
+    return {name: PREFETCH_URL + filename
+            for name, filename in _manifest['files'].items()}
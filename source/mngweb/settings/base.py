@@ -5,6 +5,7 @@ Django settings for mngweb project.
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 import os
+import tempfile
 
 PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 BASE_DIR = os.path.dirname(PROJECT_DIR)
@@ -68,6 +69,7 @@ MIDDLEWARE_CLASSES = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.auth.middleware.SessionAuthenticationMiddleware',
+    'portal.middleware.LimsfmRequestMemoMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -308,17 +310,56 @@ WAGTAILADMIN_RICH_TEXT_EDITORS = {
 
 # Cache settings
 
+# One cache shared by all gunicorn workers and management commands (sync
+# commands and the sample sheet worker evict and version entries in it).
+# Kept outside the source tree; set MNGWEB_CACHE_LOCATION to move it
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'mngweb.cache_backends.SQLiteCache',
+        'LOCATION': os.environ.get(
+            'MNGWEB_CACHE_LOCATION',
+            os.path.join(tempfile.gettempdir(), 'mngweb', 'cache.sqlite3')),
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+            'CULL_FREQUENCY': 4,
+        },
     }
 }
 
+EBI_TAXONOMY_CACHE_TIMEOUT = 86400  # 24 hours
+EBI_TAXONOMY_TIMEOUT = 10  # seconds; taxid lookups
+EBI_TYPEAHEAD_TIMEOUT = 3  # seconds; EBI searches proxied for typeaheads
+EBI_TYPEAHEAD_CACHE_TIMEOUT = 3600  # seconds
+EBI_TYPEAHEAD_CACHE_SIZE = 1000  # searches kept in each worker's LRU cache
+TYPEAHEAD_MAX_RESULTS = 10  # names returned for a query
+TYPEAHEAD_PAGE_SIZE = 1000  # names per page of a full (prefetch) listing
+TYPEAHEAD_CACHE_MAX_AGE = 300  # seconds browsers/proxies may reuse a response
+TYPEAHEAD_PREFETCH_DIR = 'typeahead'  # in STATIC_ROOT; see deploy_tools/nginx
+
+
+# LIMSfm (RESTfm) client
+# RESTFM_BASE_URL and RESTFM_KEY are set in local.py
+
+RESTFM_POOL_SIZE = 10  # keep-alive connections per worker
+RESTFM_TIMEOUT = 60  # seconds
+RESTFM_TIMEOUTS = {  # per-endpoint overrides, matched by uri prefix
+    'bulk/': 120,
+    'layout/project_contact_api': 20,
+    'layout/sample_api': 3,
+}
+RESTFM_CONCURRENT_FETCH = True  # fan out project/permissions/lines requests
+RESTFM_FETCH_WORKERS = 4
+RESTFM_BULK_CHUNK_SIZE = 50  # projectlines per bulk PUT
+RESTFM_BULK_PARALLEL = False  # send bulk chunks concurrently
+RESTFM_BULK_RETRIES = 2
+RESTFM_BULK_BACKOFF = 1.0  # seconds, doubled for each retry
+LIMSFM_CACHE_TIMEOUT = 300  # seconds; portal project/contact reads
+
 
-# django-excel
+# Sample sheet uploads
 
-FILE_UPLOAD_HANDLERS = ("django_excel.ExcelMemoryFileUploadHandler",
-                        "django_excel.TemporaryExcelFileUploadHandler")
+EBI_TAXONOMY_FETCH_WORKERS = 4  # concurrent batched EBI taxonomy searches
 
 
 # django-phonenumber-field settings
@@ -8,6 +8,10 @@ SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 
 LIMS_STATS_CACHE_TIMEOUT = 86400  # 24 hours
 
+# In the site's cache folder, next to its database (see deploy_tools/fabfile.py)
+CACHES['default']['LOCATION'] = os.environ.get(
+    'MNGWEB_CACHE_LOCATION', os.path.join(BASE_DIR, '../cache/cache.sqlite3'))
+
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 
 SLACK_FAIL_SILENTLY = True
@@ -0,0 +1,254 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from . import cache_backends, caching, fts
+from .cache_backends import SQLiteCache
+
+
+# Keep tests off the shared cache, whose dataset versions and generations
+# a running dev server relies on
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'mngweb-tests',
+    }
+}
+
+
+class SQLiteCacheTest(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = SQLiteCache(
+            os.path.join(self.directory, 'cache.sqlite3'),
+            {'OPTIONS': {'MAX_ENTRIES': 10, 'CULL_FREQUENCY': 2}})
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_set_get_delete(self):
+        self.cache.set('a', {'value': 1})
+        self.assertEqual(self.cache.get('a'), {'value': 1})
+        self.cache.delete('a')
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_add_and_incr(self):
+        self.assertTrue(self.cache.add('n', 1))
+        self.assertFalse(self.cache.add('n', 5))
+        self.assertEqual(self.cache.incr('n'), 2)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_expiry(self):
+        self.cache.set('a', 1, 10)
+        with mock.patch('time.time', return_value=1e12):
+            self.assertIsNone(self.cache.get('a'))
+
+    def test_cull_keeps_entries_without_expiry(self):
+        self.cache.set('version', 'v1', None)
+        with mock.patch.object(cache_backends, 'CULL_CHECK_INTERVAL', 1):
+            for i in range(30):
+                self.cache.set('key%d' % i, i)
+        self.assertEqual(self.cache.get('version'), 'v1')
+        self.assertLessEqual(self.cache.stats()['entries'], 11)
+        self.assertEqual(self.cache.get('key29'), 29)
+
+    def test_cull_only_checks_every_interval(self):
+        with mock.patch.object(cache_backends, 'CULL_CHECK_INTERVAL', 1000):
+            for i in range(30):
+                self.cache.set('key%d' % i, i)
+        self.assertEqual(self.cache.stats()['entries'], 30)
+
+
+class FtsTest(SimpleTestCase):
+
+    def setUp(self):
+        self.db = sqlite3.connect(':memory:')
+        self.cursor = self.db.cursor()
+        if not fts.fts5_available(self.cursor):
+            self.skipTest("SQLite without FTS5")
+        self.cursor.execute('CREATE TABLE taxon (id INTEGER PRIMARY KEY, '
+                            'name TEXT, data_set TEXT)')
+        self.insert(1, 'Escherichia coli', 'Prokaryotes')
+        fts.create_shadow_table(self.cursor, 'taxon')
+
+    def tearDown(self):
+        self.db.close()
+
+    def insert(self, pk, name, data_set='Prokaryotes'):
+        self.cursor.execute('INSERT INTO taxon VALUES (?, ?, ?)',
+                            [pk, name, data_set])
+
+    def search(self, q, **kwargs):
+        return fts.search(self.cursor, 'taxon', q, 10, placeholder='?',
+                          **kwargs)
+
+    def test_match_query(self):
+        self.assertEqual(fts.match_query('E. coli'), '"E"* "coli"*')
+        self.assertIsNone(fts.match_query(' -- '))
+
+    def test_existing_rows_are_indexed(self):
+        self.assertEqual(self.search('coli'), ['Escherichia coli'])
+        self.assertEqual(self.search('esch co'), ['Escherichia coli'])
+        self.assertEqual(self.search('--'), [])
+
+    def test_triggers_follow_inserts_updates_and_deletes(self):
+        self.insert(2, 'Bacillus subtilis')
+        self.assertEqual(self.search('subt'), ['Bacillus subtilis'])
+
+        self.cursor.execute(
+            "UPDATE taxon SET name = 'Bacillus cereus' WHERE id = 2")
+        self.assertEqual(self.search('subt'), [])
+        self.assertEqual(self.search('cereus'), ['Bacillus cereus'])
+
+        self.cursor.execute('DELETE FROM taxon WHERE id = 2')
+        self.assertEqual(self.search('bacillus'), [])
+
+    def test_names_starting_with_query_rank_first(self):
+        self.insert(2, 'Coliform bacterium')
+        self.assertEqual(self.search('coli'),
+                         ['Coliform bacterium', 'Escherichia coli'])
+
+    def test_where_filters_content_table(self):
+        self.insert(2, 'Escherichia virus', 'Viruses')
+        self.assertEqual(
+            self.search('escherichia', where='AND c.data_set = ?',
+                        params=['Viruses']),
+            ['Escherichia virus'])
+
+    def test_drop_shadow_table(self):
+        fts.drop_shadow_table(self.cursor, 'taxon')
+        self.insert(2, 'Bacillus subtilis')  # no trigger left to fail
+        self.cursor.execute("SELECT name FROM sqlite_master "
+                            "WHERE name LIKE 'taxon_fts%'")
+        self.assertEqual(self.cursor.fetchall(), [])
+
+
+class SynchronousThread(object):
+    """Stands in for threading.Thread, running target on start()"""
+
+    def __init__(self, target, args=(), daemon=None):
+        self.target = target
+        self.args = args
+
+    def start(self):
+        self.target(*self.args)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CachedComputationTest(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.calls = []
+
+    def compute(self):
+        self.calls.append(1)
+        return len(self.calls)
+
+    def test_computed_once_while_fresh(self):
+        for i in range(2):
+            self.assertEqual(
+                caching.cached_computation('key', self.compute, 60), 1)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_stale_value_served_while_refreshing(self):
+        caching.cached_computation('key', self.compute, 60)
+        with mock.patch('time.time', return_value=time.time() + 90), \
+                mock.patch.object(caching.threading, 'Thread',
+                                  SynchronousThread):
+            self.assertEqual(
+                caching.cached_computation('key', self.compute, 60), 1)
+        self.assertEqual(cache.get('key')[0], 2)
+        self.assertIsNone(cache.get(caching._lock_key('key')))
+
+    def test_failed_computation_is_not_cached(self):
+        def fail():
+            raise ValueError('failed')
+        with self.assertRaises(ValueError):
+            caching.cached_computation('key', fail, 60)
+        self.assertEqual(
+            caching.cached_computation('key', self.compute, 60), 1)
+
+    def test_seeded_values(self):
+        caching.set_cached_values({'key': 'seeded'}, 60)
+        self.assertEqual(
+            caching.cached_computation('key', self.compute, 60), 'seeded')
+        self.assertEqual(self.calls, [])
+
+
+class LocalLRUCacheTest(SimpleTestCase):
+
+    def test_evicts_least_recently_used(self):
+        lru = caching.LocalLRUCache(2, 60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEqual([lru.get('a'), lru.get('b'), lru.get('c')],
+                         [1, None, 3])
+
+    def test_expiry(self):
+        lru = caching.LocalLRUCache(2, 60)
+        lru.set('a', 1)
+        with mock.patch('time.time', return_value=1e12):
+            self.assertEqual(lru.get('a', 'missing'), 'missing')
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CoalesceTest(SimpleTestCase):
+
+    def call_concurrently(self, func, threads=5):
+        """Call coalesce('key', func) from several threads at once, with
+           func blocked until every thread has called coalesce"""
+        started = threading.Semaphore(0)
+        release = threading.Event()
+        results = []
+
+        def blocked():
+            release.wait(5)
+            return func()
+
+        def call():
+            started.release()
+            try:
+                results.append(caching.coalesce('key', blocked))
+            except Exception as e:
+                results.append(e)
+        workers = [threading.Thread(target=call) for i in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            started.acquire()
+        release.set()
+        for worker in workers:
+            worker.join()
+        return results
+
+    def test_concurrent_calls_share_one_result(self):
+        calls = []
+        results = self.call_concurrently(lambda: calls.append(1) or 'value')
+        self.assertEqual(results, ['value'] * 5)
+        self.assertLess(len(calls), 5)
+        self.assertEqual(caching._inflight, {})
+
+    def test_exception_reaches_every_caller(self):
+        def fail():
+            raise ValueError('failed')
+        results = self.call_concurrently(fail)
+        self.assertTrue(all(isinstance(r, ValueError) for r in results))
+        self.assertEqual(caching._inflight, {})
+
+    def test_later_calls_run_again(self):
+        calls = []
+        for i in range(2):
+            caching.coalesce('key', lambda: calls.append(i))
+        self.assertEqual(calls, [0, 1])
@@ -0,0 +1,220 @@
+"""In-process search indexes for the typeahead endpoints.
+
+A TypeaheadIndex holds the names of a model (or a filtered queryset) in
+memory and answers case-insensitive substring queries without touching
+the database. Matches are ranked: names starting with the query first,
+then names with a word starting with it, then other substring matches,
+each group in the source's (alphabetical) order. Indexes are built on
+first use (or by warm_typeahead_indexes()) and rebuilt when their dataset
+version changes, i.e. after the table has been re-synced.
+
+Endpoints serve indexes with typeahead_response(), wrapped in
+typeahead_cache() so that responses carry an ETag and Last-Modified taken
+from the dataset version the sync commands bump, and conditional requests
+get 304s.
+"""
+import logging
+import re
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+
+from mngweb.caching import dataset_version_datetime
+from mngweb.lookups import VersionedData
+
+
+logger = logging.getLogger(__name__)
+
+MAX_RESULTS = getattr(settings, 'TYPEAHEAD_MAX_RESULTS', 10)
+PAGE_SIZE = getattr(settings, 'TYPEAHEAD_PAGE_SIZE', 1000)
+CACHE_MAX_AGE = getattr(settings, 'TYPEAHEAD_CACHE_MAX_AGE', 300)
+
+NGRAM_SIZE = 3
+WORD_START = re.compile(r'\b\w')
+
+_indexes = []
+
+
+class TypeaheadIndex(VersionedData):
+
+    def __init__(self, dataset, source, warm=True):
+        """source is a function returning the names to index, in the
+           order the endpoint should list them. warm (a bool, or a function
+           returning one) says whether warm_typeahead_indexes() builds it,
+           e.g. not when the index is only a fallback for an FTS search"""
+        super(TypeaheadIndex, self).__init__(dataset)
+        self.source = source
+        self.warm = warm
+        _indexes.append(self)
+
+    def build(self):
+        names = [str(name) for name in self.source()]
+        folded = [name.lower() for name in names]
+
+        # Sorted name and word prefixes, searched with bisect
+        prefixes = sorted((f, i) for i, f in enumerate(folded))
+        words = sorted((f[m.start():], i) for i, f in enumerate(folded)
+                       for m in WORD_START.finditer(f) if m.start())
+
+        # n-gram -> ids of the names containing it, for substrings
+        ngrams = defaultdict(list)
+        for i, f in enumerate(folded):
+            for gram in set(f[j:j + NGRAM_SIZE]
+                            for j in range(len(f) - NGRAM_SIZE + 1)):
+                ngrams[gram].append(i)
+
+        return {
+            'names': names,
+            'folded': folded,
+            'prefix_keys': [p[0] for p in prefixes],
+            'prefix_ids': [p[1] for p in prefixes],
+            'word_keys': [w[0] for w in words],
+            'word_ids': [w[1] for w in words],
+            'ngrams': dict(ngrams),
+        }
+
+    @staticmethod
+    def _prefixed(keys, ids, q):
+        """Return the ids whose keys start with q"""
+        matched = []
+        for k in range(bisect_left(keys, q), len(keys)):
+            if not keys[k].startswith(q):
+                break
+            matched.append(ids[k])
+        return matched
+
+    @staticmethod
+    def _containing(index, q):
+        """Return the ids of the names containing q, in source order"""
+        folded = index['folded']
+        if len(q) < NGRAM_SIZE:
+            candidates = range(len(folded))
+        else:
+            postings = []
+            for j in range(len(q) - NGRAM_SIZE + 1):
+                ids = index['ngrams'].get(q[j:j + NGRAM_SIZE])
+                if not ids:
+                    return []
+                postings.append(ids)
+            postings.sort(key=len)
+            candidates = set(postings[0])
+            for ids in postings[1:]:
+                candidates.intersection_update(ids)
+            candidates = sorted(candidates)
+        return [i for i in candidates if q in folded[i]]
+
+    def search(self, q, limit=None):
+        """Return the names matching q, best first (all names, in source
+           order, for an empty query)"""
+        index = self.data()
+        names = index['names']
+        q = q.strip().lower()
+        if not q:
+            return names[:limit] if limit else list(names)
+
+        results = []
+        seen = set()
+
+        def add(ids):
+            for i in ids:
+                if i not in seen:
+                    seen.add(i)
+                    results.append(i)
+                    if limit and len(results) >= limit:
+                        return True
+            return False
+
+        # Name prefixes come out of the sorted keys in alphabetical order
+        if add(self._prefixed(index['prefix_keys'], index['prefix_ids'], q)):
+            return [names[i] for i in results]
+        if add(sorted(self._prefixed(index['word_keys'], index['word_ids'],
+                                     q))):
+            return [names[i] for i in results]
+        add(self._containing(index, q))
+        return [names[i] for i in results]
+
+    def page(self, cursor, size):
+        """Return up to size names, in source order, from position cursor
+           (an int), and the cursor of the next page (None on the last)"""
+        names = self.data()['names']
+        end = cursor + size
+        return names[cursor:end], end if end < len(names) else None
+
+
+def queryset_page(queryset, cursor, size):
+    """Like TypeaheadIndex.page(), for an ordered queryset of names: one
+       LIMIT/OFFSET query, fetching a row past the page to tell whether
+       there is a next one"""
+    names = [str(name) for name in queryset[cursor:cursor + size + 1]]
+    end = cursor + size
+    return names[:size], end if len(names) > size else None
+
+
+def typeahead_response(request, index, search=None, page=None):
+    """Return the typeahead JSON list for request.
+
+    With a 'q' parameter: the best names matching it, at most MAX_RESULTS
+    (or 'limit', if smaller), found with search(q, limit) if given (e.g.
+    an FTS search) or else index.search(). Without: a page of every name,
+    PAGE_SIZE (or 'limit') long, starting at the 'cursor' parameter, from
+    page(cursor, size) if given (e.g. a queryset_page()) or else
+    index.page(), with a Link header to the next page.
+    """
+    q = request.GET.get('q', '').strip()
+    try:
+        limit = int(request.GET.get('limit', 0))
+        cursor = int(request.GET.get('cursor', 0))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid limit or cursor'}, status=400)
+    if limit < 0 or cursor < 0:
+        return JsonResponse({'error': 'Invalid limit or cursor'}, status=400)
+
+    if q:
+        limit = min(limit or MAX_RESULTS, MAX_RESULTS)
+        data = search(q, limit) if search else index.search(q, limit=limit)
+        return JsonResponse(data, safe=False)
+
+    page = page or index.page
+    data, next_cursor = page(cursor, min(limit or PAGE_SIZE, PAGE_SIZE))
+    response = JsonResponse(data, safe=False)
+    if next_cursor is not None:
+        params = request.GET.copy()
+        params['cursor'] = next_cursor
+        response['Link'] = '<{}?{}>; rel="next"'.format(
+            request.path, params.urlencode())
+    return response
+
+
+def typeahead_cache(index):
+    """Decorator for views serving index: responses are public for
+       CACHE_MAX_AGE seconds and validated by the index's dataset version,
+       so they stay valid until the next sync. Until a sync has set a
+       version, responses carry no validators."""
+    def etag(request, *args, **kwargs):
+        return index.version()
+
+    def last_modified(request, *args, **kwargs):
+        return dataset_version_datetime(index.version())
+
+    def decorator(view):
+        view = condition(etag_func=etag, last_modified_func=last_modified)(view)
+        return cache_control(public=True, max_age=CACHE_MAX_AGE)(view)
+    return decorator
+
+
+def warm_typeahead_indexes():
+    """Build the registered indexes that want warming now rather than on
+       their first query"""
+    for index in _indexes:
+        try:
+            warm = index.warm() if callable(index.warm) else index.warm
+            if not warm:
+                continue
+            index.data()
+        except Exception:
+            logger.exception("Could not build typeahead index %s",
+                             index.dataset)
@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mngweb.settings.production")
 
 application = get_wsgi_application()
+
+# Build the in-process typeahead indexes before the first request needs
+# them (importing the URLconf imports the views that define them)
+from django.core.urlresolvers import get_resolver  # noqa: E402
+from mngweb.typeahead import warm_typeahead_indexes  # noqa: E402
+
+get_resolver().url_patterns
+warm_typeahead_indexes()
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+from mngweb import fts
+
+
+def create_organisation_fts(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        if fts.fts5_available(cursor):
+            fts.create_shadow_table(cursor, 'organisation_organisation')
+
+
+def drop_organisation_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        fts.drop_shadow_table(cursor, 'organisation_organisation')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organisation', '0002_auto_20160905_1120'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_organisation_fts, drop_organisation_fts),
+    ]
@@ -3,6 +3,10 @@ from __future__ import unicode_literals
 from django.db import models
 
 
+# dataset version name, bumped by update_organisations()
+ORGANISATIONS_DATASET = 'organisations'
+
+
 class Organisation(models.Model):
     id = models.IntegerField(primary_key=True)
     name = models.CharField(max_length=255)
@@ -3,16 +3,23 @@ $(function() {
   var organisation = new Bloodhound({
     datumTokenizer: Bloodhound.tokenizers.whitespace,
     queryTokenizer: Bloodhound.tokenizers.whitespace,
-    prefetch: '/organisation/typeahead/'
+    prefetch: mngweb.typeahead.prefetchUrl('organisations',
+                                           '/organisation/typeahead/'),
+    // Without a static prefetch file, the prefetch only holds the first
+    // page of names
+    remote: {
+      url: '/organisation/typeahead/?q=%QUERY',
+      wildcard: '%QUERY'
+    }
   });
 
-  function organisationShowAllOnEmpty(q, sync) {
+  function organisationShowAllOnEmpty(q, sync, async) {
     if (q === '') {
       sync(organisation.index.all());
     }
 
     else {
-      organisation.search(q, sync);
+      organisation.search(q, sync, async);
     }
   }
 
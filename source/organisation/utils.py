@@ -1,7 +1,9 @@
 from django.utils import timezone
 
+from mngweb.caching import bump_dataset_version
+from mngweb.prefetch import write_prefetch
 from portal.services import limsfm_get_organisations
-from .models import Organisation
+from .models import ORGANISATIONS_DATASET, Organisation
 
 
 def update_organisations():
@@ -31,6 +33,14 @@ def update_organisations():
     delete_set = Organisation.objects.filter(updated__lt=start_time)
     deleted_count = len(delete_set)
     delete_set.delete()
+    bump_dataset_version(ORGANISATIONS_DATASET)
+    write_organisations_prefetch()
 
     print("Organisation update completed. %d created, %d updated, %d deleted." %
           (created_count, updated_count, deleted_count))
+
+
+def write_organisations_prefetch():
+    """write the organisation typeahead prefetch file"""
+    write_prefetch('organisations',
+                   Organisation.objects.values_list('name', flat=True))
@@ -1,15 +1,34 @@
-from django.http import JsonResponse
+from django.db import connection
 
-from .models import Organisation
+from mngweb import fts
+from mngweb.typeahead import (TypeaheadIndex, queryset_page,
+                              typeahead_cache, typeahead_response)
+from .models import ORGANISATIONS_DATASET, Organisation
 
 
+ORGANISATIONS_TABLE = Organisation._meta.db_table
+
+# Fallback for databases without an FTS5 shadow table
+organisation_index = TypeaheadIndex(
+    ORGANISATIONS_DATASET,
+    lambda: Organisation.objects.values_list('name', flat=True),
+    warm=lambda: not fts.shadow_table_exists(ORGANISATIONS_TABLE))
+
+
+def organisation_fts_search(q, limit):
+    with connection.cursor() as cursor:
+        return fts.search(cursor, ORGANISATIONS_TABLE, q, limit)
+
+
+def organisation_page(cursor, size):
+    return queryset_page(
+        Organisation.objects.order_by('name').values_list('name', flat=True),
+        cursor, size)
+
+
+@typeahead_cache(organisation_index)
 def organisation_typeahead(request):
-    q = request.GET.get('q', '')
-    if q:
-        matches = (Organisation.objects
-                   .filter(name__icontains=q)
-                   .values_list('name', flat=True)[:10])
-    else:
-        matches = Organisation.objects.all().values_list('name', flat=True)
-    data = list(matches)
-    return JsonResponse(data, safe=False)
+    search = page = None
+    if fts.shadow_table_exists(ORGANISATIONS_TABLE):
+        search, page = organisation_fts_search, organisation_page
+    return typeahead_response(request, organisation_index, search, page)
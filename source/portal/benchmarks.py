@@ -0,0 +1,254 @@
+"""Benchmarks for the portal's heavier code paths.
+
+Run with ``manage.py runbenchmarks``. Each benchmark is called with a size
+(number of projectlines/rows) and returns a dict of measurements; none of
+them make LIMSfm or EBI requests.
+"""
+import io
+import random
+import sqlite3
+import time
+import tracemalloc
+from collections import OrderedDict
+
+from country.models import Country
+from mngweb import fts
+from taxon.models import NcbiTaxon
+from .sample_sheet import (
+    parse_sample_sheet, read_sample_sheet, write_sample_sheet)
+from .services import (PROJECTLINE_DJANGO_TO_LIMSFM_MAP, bool_from_fmstr,
+                       projectline_from_limsfm)
+
+
+BENCHMARKS = OrderedDict()
+
+DEFAULT_SIZES = [1000, 5000, 20000]
+
+WELLS_PER_PLATE = 96
+
+
+def benchmark(name, sizes=None):
+    """Register a benchmark function under name, run by default at sizes
+       (or DEFAULT_SIZES)"""
+    def register(func):
+        func.sizes = sizes or DEFAULT_SIZES
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+def measure(func, *args):
+    """Call func(*args); return its result, seconds taken and peak
+       traced memory in MiB"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = func(*args)
+    finally:
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, elapsed, peak / (1024 * 1024)
+
+
+def measure_retained(func, *args):
+    """Call func(*args); return its result, seconds taken and the traced
+       memory in MiB still held afterwards (i.e. by the result)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = func(*args)
+    finally:
+        elapsed = time.perf_counter() - start
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    return result, elapsed, current / (1024 * 1024)
+
+
+def seed_reference_data():
+    """Add the country and taxon synthetic projects use, if missing, so
+       validating them needs no lookups beyond the database. Returns the
+       country"""
+    country, created = Country.objects.get_or_create(iso2='GB', defaults={
+        'iso3': 'GBR', 'name': 'United Kingdom', 'phone_country_code': '44',
+        'phone_trunk_code': '0'})
+    NcbiTaxon.objects.get_or_create(taxid=562, defaults={
+        'parent_taxid': 561, 'rank': 'species', 'name': 'Escherichia coli'})
+    return country
+
+
+def synthetic_project(size):
+    """A project dict shaped like limsfm_get_project's, with size lines
+       spread across 96 well plates"""
+    country = seed_reference_data()
+    projectlines = []
+    for i in range(size):
+        plate, well = divmod(i, WELLS_PER_PLATE)
+        projectlines.append({
+            'uuid': 'benchmark-%d' % i,
+            'aliquottype_name': 'Strain',
+            'container_ref': 'Plate %d' % (plate + 1),
+            'well_alpha': '%s%d' % ('ABCDEFGH'[well % 8], well // 8 + 1),
+            'sample_ref': '%d' % (100000 + i),
+            'customers_ref': 'Sample %d' % i,
+            'dna_concentration_ng_ul': '',
+            'volume_ul': '',
+            'taxon_id': '562',
+            'collection_day': '1',
+            'collection_month': '6',
+            'collection_year': '2016',
+            'geo_country': country.iso2,
+            'geo_country_name': country.name,
+            'geo_specific_location': 'Birmingham',
+            'study_type': 'Lab',
+            'lab_experiment_type': 'Other',
+            'further_details': 'Benchmark',
+            'host_taxon_id': '',
+            'host_sample_type': '',
+            'environmental_sample_type': '',
+        })
+    return {'reference': 'BENCHMARK', 'projectlines': projectlines}
+
+
+def _sample_sheet_content(project):
+    fileobj = io.BytesIO()
+    write_sample_sheet(project, fileobj)
+    return fileobj.getvalue()
+
+
+@benchmark('sample_sheet_write')
+def sample_sheet_write(size):
+    project = synthetic_project(size)
+    content, seconds, peak = measure(_sample_sheet_content, project)
+    return OrderedDict([('seconds', seconds), ('peak_mib', peak),
+                        ('file_kib', len(content) / 1024)])
+
+
+@benchmark('sample_sheet_download', sizes=[10, 100, 1000])
+def sample_sheet_download(size):
+    """A download once the process has prepared the template, as every
+       download after the first is"""
+    project = synthetic_project(size)
+    _sample_sheet_content(project)
+    content, seconds, peak = measure(_sample_sheet_content, project)
+    return OrderedDict([('seconds', seconds), ('peak_mib', peak),
+                        ('file_kib', len(content) / 1024)])
+
+
+@benchmark('sample_sheet_read')
+def sample_sheet_read(size):
+    content = _sample_sheet_content(synthetic_project(size))
+    rows, seconds, peak = measure(
+        lambda: sum(1 for _ in read_sample_sheet(content, 'xlsx')))
+    return OrderedDict([('seconds', seconds), ('peak_mib', peak),
+                        ('rows', rows)])
+
+
+@benchmark('sample_sheet_parse')
+def sample_sheet_parse(size):
+    project = synthetic_project(size)
+    content = _sample_sheet_content(project)
+    parsed, seconds, peak = measure(
+        lambda: parse_sample_sheet(
+            project, read_sample_sheet(content, 'xlsx')))
+    return OrderedDict([('seconds', seconds), ('peak_mib', peak),
+                        ('errors', len(parsed['errors'])),
+                        ('unchanged', parsed['unchanged'])])
+
+
+def synthetic_projectline_records(size):
+    """LIMSfm projectline records, as returned by the projectline layout"""
+    records = []
+    for pl in synthetic_project(size)['projectlines']:
+        record = {f: '' for f in PROJECTLINE_DJANGO_TO_LIMSFM_MAP.values()}
+        for d, value in pl.items():
+            if d in PROJECTLINE_DJANGO_TO_LIMSFM_MAP:
+                record[PROJECTLINE_DJANGO_TO_LIMSFM_MAP[d]] = value
+        record['Sample::is_confidential'] = '0'
+        records.append(record)
+    return records
+
+
+def _dict_projectline_from_limsfm(limsfm_projectline):
+    """Projectline conversion as plain dicts, walking the field map per
+       record (the approach compile_mapper replaced); for comparison"""
+    projectline = {}
+    for d, f in PROJECTLINE_DJANGO_TO_LIMSFM_MAP.items():
+        if f in limsfm_projectline:
+            projectline[d] = limsfm_projectline[f]
+    projectline['is_confidential'] = bool_from_fmstr(
+        projectline['is_confidential'])
+    return projectline
+
+
+@benchmark('projectline_mapping', sizes=[2000])
+def projectline_mapping(size):
+    records = synthetic_projectline_records(size)
+    results = OrderedDict()
+    for label, convert in [('dict', _dict_projectline_from_limsfm),
+                           ('compiled', projectline_from_limsfm)]:
+        projectlines, seconds, retained = measure_retained(
+            lambda: [convert(r) for r in records])
+        results[label + '_seconds'] = seconds
+        results[label + '_mib'] = retained
+        del projectlines
+    return results
+
+
+TAXON_SEARCH_QUERIES = 200
+
+TAXON_SYLLABLES = ['ba', 'ci', 'lus', 'es', 'che', 'ri', 'chia', 'sal', 'mo',
+                   'nel', 'la', 'strep', 'to', 'coc', 'cus', 'sta', 'phy',
+                   'pseu', 'do', 'mo', 'nas', 'clos', 'tri', 'di', 'um',
+                   'my', 'co', 'bac', 'te', 'au', 're', 'us', 'en', 'vib']
+
+
+def _taxon_word(rng):
+    return ''.join(rng.choice(TAXON_SYLLABLES)
+                   for _ in range(rng.randint(3, 5)))
+
+
+def _percentile(timings, p):
+    timings = sorted(timings)
+    return timings[min(len(timings) - 1, int(len(timings) * p))]
+
+
+@benchmark('taxon_search', sizes=[100000])
+def taxon_search(size):
+    """LIKE '%q%' scans against FTS5 shadow table searches of size
+       synthetic taxa, in an in-memory SQLite database"""
+    rng = random.Random(0)
+    db = sqlite3.connect(':memory:')
+    cursor = db.cursor()
+    if not fts.fts5_available(cursor):
+        return OrderedDict([('fts5', False)])
+    cursor.execute('CREATE TABLE taxon_taxon '
+                   '(id INTEGER PRIMARY KEY, name TEXT, data_set TEXT)')
+    cursor.executemany(
+        'INSERT INTO taxon_taxon (name, data_set) VALUES (?, ?)',
+        (('%s %s' % (_taxon_word(rng).capitalize(), _taxon_word(rng)),
+          'Prokaryotes')
+         for i in range(size)))
+    fts.create_shadow_table(cursor, 'taxon_taxon')
+    queries = [_taxon_word(rng)[:rng.randint(4, 8)]
+               for _ in range(TAXON_SEARCH_QUERIES)]
+
+    def like(q):
+        cursor.execute('SELECT name FROM taxon_taxon WHERE name LIKE ? '
+                       'ORDER BY name LIMIT 10', ['%' + q + '%'])
+        return cursor.fetchall()
+
+    results = OrderedDict()
+    for label, search in [
+            ('like', like),
+            ('fts', lambda q: fts.search(cursor, 'taxon_taxon', q, 10,
+                                         placeholder='?'))]:
+        timings = []
+        for q in queries:
+            start = time.perf_counter()
+            search(q)
+            timings.append((time.perf_counter() - start) * 1000)
+        results[label + '_p50_ms'] = _percentile(timings, 0.5)
+        results[label + '_p95_ms'] = _percentile(timings, 0.95)
+    db.close()
+    return results
@@ -1,6 +1,29 @@
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
 import requests
 
-from django.core.cache import cache
+from django.conf import settings
+
+from mngweb.caching import (LocalLRUCache, cached_computation, coalesce,
+                            get_cached_values, set_cached_values)
+from taxon.models import NcbiTaxon
+
+
+EBI_TAXONOMY_URL = 'https://www.ebi.ac.uk/ebisearch/ws/rest/taxonomy'
+EBI_BATCH_SIZE = 100  # max page size of the EBI search API
+LOCAL_BATCH_SIZE = 500  # stay well below SQLite's 999 query parameters
+EBI_TAXONOMY_TIMEOUT = getattr(settings, 'EBI_TAXONOMY_TIMEOUT', 10)
+
+EBI_TYPEAHEAD_TIMEOUT = getattr(settings, 'EBI_TYPEAHEAD_TIMEOUT', 3)
+EBI_TYPEAHEAD_CACHE_TIMEOUT = getattr(
+    settings, 'EBI_TYPEAHEAD_CACHE_TIMEOUT', 3600)
+EBI_TYPEAHEAD_PARAMS = ('query', 'fields', 'size', 'start', 'sort')
+
+_typeahead_cache = LocalLRUCache(
+    getattr(settings, 'EBI_TYPEAHEAD_CACHE_SIZE', 1000),
+    EBI_TYPEAHEAD_CACHE_TIMEOUT)
 
 
 class NoTaxonFoundException(Exception):
@@ -14,7 +37,8 @@ def ebi_get_taxonomy_by_id(taxid):
         'format': 'json'
     }
     payload_str = "&".join('%s=%s' % (k, v) for k, v in payload.items())
-    response = requests.get('https://www.ebi.ac.uk/ebisearch/ws/rest/taxonomy', params=payload_str)
+    response = requests.get(EBI_TAXONOMY_URL, params=payload_str,
+                            timeout=EBI_TAXONOMY_TIMEOUT)
     json = response.json()
     if 'entries' in json and len(json['entries']):
         return json['entries']
@@ -22,6 +46,160 @@ def ebi_get_taxonomy_by_id(taxid):
         raise NoTaxonFoundException("No entries returned for taxid '{}'".format(taxid))
 
 
+def local_taxonomy_by_id(taxid):
+    """Return EBI-style entries for taxid from the local NCBI taxonomy
+       mirror, or None if the mirror does not have it"""
+    try:
+        taxid = int(taxid)
+    except (TypeError, ValueError):
+        raise NoTaxonFoundException("Invalid taxid '{}'".format(taxid))
+    try:
+        return [NcbiTaxon.objects.get(taxid=taxid).to_ebi_entry()]
+    except NcbiTaxon.DoesNotExist:
+        return None
+
+
+def ebi_get_taxonomy_by_ids(taxids):
+    """Search EBI for up to EBI_BATCH_SIZE taxids in a single request.
+       Returns {taxid: entries} for the taxids that exist"""
+    payload = {
+        'query': 'id:({})'.format(' OR '.join(taxids)),
+        'fields': 'name',
+        'size': len(taxids),
+        'format': 'json'
+    }
+    payload_str = "&".join('%s=%s' % (k, v) for k, v in payload.items())
+    response = requests.get(EBI_TAXONOMY_URL, params=payload_str,
+                            timeout=EBI_TAXONOMY_TIMEOUT)
+    found = {}
+    for entry in response.json().get('entries', []):
+        found[entry['id']] = [entry]
+    return found
+
+
+def taxonomy_cache_key(taxid):
+    return 'ebi_search_taxonomy_by_id_{}'.format(taxid)
+
+
 def ebi_search_taxonomy_by_id(taxid):
-    cache_key = 'ebi_search_taxonomy_by_id_{}'.format(taxid)
-    return cache.get_or_set(cache_key, ebi_get_taxonomy_by_id(taxid))
+    entries = local_taxonomy_by_id(taxid)
+    if entries:
+        return entries
+    return cached_computation(
+        taxonomy_cache_key(taxid),
+        lambda: ebi_get_taxonomy_by_id(taxid),
+        getattr(settings, 'EBI_TAXONOMY_CACHE_TIMEOUT', 86400))
+
+
+def ebi_search_taxonomy_by_ids(taxids):
+    """
+    Resolve many taxids at once: from the local mirror, then the cache, then
+    batched EBI searches (whose results are cached for later single lookups).
+    Returns {taxid: entries}, keyed by the taxids as given (which may be
+    e.g. '0562' or ' 562'), with None for taxids that do not exist. Taxids
+    that could not be checked because EBI was unreachable are left out.
+    """
+    results = {}
+    given = {}  # normalised taxid -> the taxids given for it
+    for taxid in set(taxids):
+        try:
+            given.setdefault(str(int(taxid)), []).append(taxid)
+        except (TypeError, ValueError):
+            results[taxid] = None
+
+    def resolve(taxid, entries):
+        for t in given[taxid]:
+            results[t] = entries
+
+    # Local NCBI mirror
+    numeric = [int(t) for t in given]
+    for i in range(0, len(numeric), LOCAL_BATCH_SIZE):
+        for taxon in NcbiTaxon.objects.filter(
+                taxid__in=numeric[i:i + LOCAL_BATCH_SIZE]):
+            resolve(str(taxon.taxid), [taxon.to_ebi_entry()])
+    remaining = [t for t in given if given[t][0] not in results]
+
+    # Cached EBI lookups
+    keys = {taxonomy_cache_key(t): t for t in remaining}
+    for key, entries in get_cached_values(list(keys)).items():
+        resolve(keys[key], entries)
+    remaining = [t for t in remaining if given[t][0] not in results]
+
+    # Batched EBI searches, run concurrently
+    batches = [remaining[i:i + EBI_BATCH_SIZE]
+               for i in range(0, len(remaining), EBI_BATCH_SIZE)]
+    found = {}
+    if batches:
+        workers = min(len(batches),
+                      getattr(settings, 'EBI_TAXONOMY_FETCH_WORKERS', 4))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [(batch, executor.submit(ebi_get_taxonomy_by_ids, batch))
+                       for batch in batches]
+            for batch, future in futures:
+                try:
+                    batch_found = future.result()
+                except (requests.RequestException, ValueError):
+                    continue  # unreachable, or not a JSON response
+                for taxid in batch:
+                    resolve(taxid, batch_found.get(taxid))
+                found.update(batch_found)
+    if found:
+        set_cached_values(
+            {taxonomy_cache_key(t): e for t, e in found.items()},
+            getattr(settings, 'EBI_TAXONOMY_CACHE_TIMEOUT', 86400))
+
+    return results
+
+
+def normalise_ebi_typeahead_params(params):
+    """Return the EBI search parameters of a typeahead request, with
+       whitespace collapsed and size capped, in a canonical order"""
+    normalised = {'format': 'json'}
+    for name in EBI_TYPEAHEAD_PARAMS:
+        value = ' '.join(params.get(name, '').split())
+        if value:
+            normalised[name] = value
+    for name, maximum in [('size', EBI_BATCH_SIZE), ('start', None)]:
+        if name in normalised:
+            try:
+                value = max(0, int(normalised[name]))
+            except ValueError:
+                del normalised[name]
+                continue
+            normalised[name] = min(value, maximum) if maximum else value
+    return sorted(normalised.items())
+
+
+def ebi_get_typeahead(params):
+    response = requests.get(EBI_TAXONOMY_URL, params=params,
+                            timeout=EBI_TYPEAHEAD_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+
+def ebi_typeahead_search(params):
+    """
+    Answer a taxonomy typeahead request (EBI search parameters, plus the
+    user's raw input as 'q'). A pure taxid is looked up in the local NCBI
+    mirror first. EBI searches are cached in this process (LRU) and in the
+    shared cache, and concurrent identical searches share one request.
+    """
+    q = params.get('q', '').strip()
+    if q.isdigit():
+        entries = local_taxonomy_by_id(q)
+        if entries:
+            return {'hitCount': len(entries), 'entries': entries}
+        params = {'query': 'id:{}'.format(int(q)), 'fields': 'name'}
+
+    search = normalise_ebi_typeahead_params(params)
+    if 'query' not in dict(search):
+        return {'hitCount': 0, 'entries': []}
+    key = 'ebi_typeahead_{}'.format(
+        hashlib.sha1(urlencode(search).encode('utf-8')).hexdigest())
+    result = _typeahead_cache.get(key)
+    if result is None:
+        result = coalesce(key, lambda: cached_computation(
+            key, lambda: ebi_get_typeahead(search),
+            EBI_TYPEAHEAD_CACHE_TIMEOUT))
+        _typeahead_cache.set(key, result)
+    return result
@@ -7,9 +7,11 @@ from django.utils.safestring import mark_safe
 from django.utils.translation import ugettext as _
 from requests import RequestException
 
+from country.lookups import countries
 from country.models import Country
 
 from .ebi_services import ebi_search_taxonomy_by_id, NoTaxonFoundException
+from .lookups import environmental_sample_types, host_sample_types
 from .models import EnvironmentalSampleType, HostSampleType
 
 
@@ -106,6 +108,24 @@ class ProjectPermissionsForm(forms.Form):
     portal_login_required = forms.IntegerField(min_value=0, max_value=1)
 
 
+class LookupChoiceField(forms.ModelChoiceField):
+    """ModelChoiceField that resolves values from an in-memory LookupTable
+       (keyed by to_field_name) instead of querying the database"""
+
+    def __init__(self, lookup, *args, **kwargs):
+        self.lookup = lookup
+        super(LookupChoiceField, self).__init__(*args, **kwargs)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        obj = self.lookup.get(value)
+        if obj is None:
+            raise ValidationError(self.error_messages['invalid_choice'],
+                                  code='invalid_choice')
+        return obj
+
+
 class ProjectLineForm(forms.Form):
     customers_ref = forms.CharField(
         max_length=100,
@@ -144,7 +164,8 @@ class ProjectLineForm(forms.Form):
         error_messages={
             'invalid': "'DNA concentration (ng/µl)' must be a number.",
         })
-    geo_country_name = forms.ModelChoiceField(
+    geo_country_name = LookupChoiceField(
+        countries,
         queryset=Country.objects.all(),
         to_field_name='name',
         label="Sample collection country",
@@ -218,13 +239,15 @@ class ProjectLineForm(forms.Form):
         label="Host Taxon Name",
         required=False,
         disabled=True)
-    host_sample_type = forms.ModelChoiceField(
+    host_sample_type = LookupChoiceField(
+        host_sample_types,
         required=False,
         queryset=HostSampleType.objects.all(),
         to_field_name='name',
         widget=forms.TextInput(),
         help_text="e.g. Stool")
-    environmental_sample_type = forms.ModelChoiceField(
+    environmental_sample_type = LookupChoiceField(
+        environmental_sample_types,
         required=False,
         queryset=EnvironmentalSampleType.objects.all(),
         to_field_name='name',
@@ -237,6 +260,20 @@ class ProjectLineForm(forms.Form):
             'required': "'Further details' is a required field.",
         })
 
+    def __init__(self, *args, **kwargs):
+        # Optional {taxid: entries or None} from ebi_search_taxonomy_by_ids
+        self.taxa = kwargs.pop('taxa', None) or {}
+        super(ProjectLineForm, self).__init__(*args, **kwargs)
+
+    def search_taxonomy(self, taxid):
+        """Resolve taxid from the pre-fetched taxa, falling back to EBI"""
+        if taxid in self.taxa:
+            if self.taxa[taxid] is None:
+                raise NoTaxonFoundException(
+                    "No entries returned for taxid '{}'".format(taxid))
+            return self.taxa[taxid]
+        return ebi_search_taxonomy_by_id(taxid)
+
     def clean(self):
         cleaned_data = super(ProjectLineForm, self).clean()
         non_field_errors = []
@@ -260,7 +297,7 @@ class ProjectLineForm(forms.Form):
               " This may be due to a service outage. Please try again after a few minutes, or contact "
               " us if the problem persists."))
         try:
-            ebi_response = ebi_search_taxonomy_by_id(taxon_id)
+            ebi_response = self.search_taxonomy(taxon_id)
         except RequestException:
             non_field_errors.append(ebi_connection_error)
         except NoTaxonFoundException:
@@ -325,7 +362,7 @@ class ProjectLineForm(forms.Form):
                 )
             if host_taxon_id:
                 try:
-                    ebi_response = ebi_search_taxonomy_by_id(host_taxon_id)
+                    ebi_response = self.search_taxonomy(host_taxon_id)
                 except RequestException:
                     non_field_errors.append(ebi_connection_error)
                 except NoTaxonFoundException:
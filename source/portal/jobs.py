@@ -0,0 +1,174 @@
+"""Background processing of uploaded sample sheets.
+
+upload_sample_sheet stores each upload as a queued SampleSheetUpload and
+returns straight away; the runsamplesheetworker management command claims
+queued uploads from the database, validates them and bulk updates LIMSfm,
+recording progress that the portal polls via upload_sample_sheet_status.
+"""
+import json
+import os
+
+import requests
+
+from django_slack import slack_message
+
+from .models import SampleSheetUpload
+from .sample_sheet import (
+    SampleSheetFileException, SampleSheetHeadersException,
+    parse_sample_sheet, read_sample_sheet)
+from .services import limsfm_bulk_update_projectlines, limsfm_get_project
+
+
+PROGRESS_EVERY = 10  # rows between progress updates
+
+INVALID_FILE_MESSAGE = ("Invalid file uploaded. Please download the Excel "
+                        "template for your project.")
+INVALID_HEADERS_MESSAGE = ("Invalid sample sheet headers. "
+                           "Have you used the correct template?")
+LIMSFM_REQUEST_MESSAGE = ("The MicrobesNG customer portal is temporarily "
+                          "unavailable. Please try again later.")
+LIMSFM_HTTP_MESSAGE = ("An unexpected error has occured. "
+                       "Please contact info@microbesng.com")
+ROW_NOT_SAVED_MESSAGE = ("This row could not be saved (%(reason)s). "
+                         "Please upload your sample sheet again.")
+
+
+def enqueue_sample_sheet_upload(project_uuid, uploaded_file):
+    """Queue an uploaded sample sheet file for the worker"""
+    return SampleSheetUpload.objects.create(
+        project_uuid=project_uuid,
+        file_name=uploaded_file.name,
+        file_content=uploaded_file.read())
+
+
+def claim_next_upload():
+    """Atomically claim the oldest queued upload; return it or None"""
+    for upload in SampleSheetUpload.objects.filter(
+            status=SampleSheetUpload.STATUS_QUEUED).only('id')[:5]:
+        claimed = (SampleSheetUpload.objects
+                   .filter(pk=upload.pk,
+                           status=SampleSheetUpload.STATUS_QUEUED)
+                   .update(status=SampleSheetUpload.STATUS_RUNNING))
+        if claimed:
+            return SampleSheetUpload.objects.get(pk=upload.pk)
+    return None
+
+
+def requeue_interrupted_uploads():
+    """Put uploads left running by a stopped worker back on the queue"""
+    return (SampleSheetUpload.objects
+            .filter(status=SampleSheetUpload.STATUS_RUNNING)
+            .update(status=SampleSheetUpload.STATUS_QUEUED))
+
+
+def _finish(upload, status, errors=None, **counts):
+    upload.status = status
+    upload.errors = json.dumps(errors or [])
+    upload.file_content = b''
+    for k, v in counts.items():
+        setattr(upload, k, v)
+    upload.save()
+
+
+def fail_upload(upload, message):
+    _finish(upload, SampleSheetUpload.STATUS_FAILED,
+            [{'row': None, 'message': message}])
+
+
+def process_upload(upload):
+    """Validate an upload and import it into LIMSfm"""
+    file_type = os.path.splitext(upload.file_name)[1].lstrip('.').lower()
+    try:
+        rows = read_sample_sheet(bytes(upload.file_content), file_type)
+    except SampleSheetHeadersException:
+        return fail_upload(upload, INVALID_HEADERS_MESSAGE)
+    except SampleSheetFileException:
+        return fail_upload(upload, INVALID_FILE_MESSAGE)
+
+    path = 'sample sheet upload {}'.format(upload.pk)
+    try:
+        # Diff against LIMSfm itself: a cached project may predate edits
+        # made since, which would then be skipped as unchanged
+        project = limsfm_get_project(upload.project_uuid, use_cache=False)
+    except requests.RequestException as e:
+        slack_message('portal/slack/limsfm_request_exception.slack',
+                      {'e': e, 'path': path})
+        return fail_upload(upload, LIMSFM_REQUEST_MESSAGE)
+
+    def progress(validated, total):
+        if validated == 0 or validated == total or not validated % PROGRESS_EVERY:
+            (SampleSheetUpload.objects.filter(pk=upload.pk)
+             .update(rows_validated=validated, rows_total=total))
+
+    try:
+        parsed = parse_sample_sheet(project, rows, progress=progress)
+    except SampleSheetFileException:
+        return fail_upload(upload, INVALID_FILE_MESSAGE)
+    upload.refresh_from_db(fields=['rows_validated', 'rows_total'])
+
+    errors = parsed['errors']
+    if errors:
+        return _finish(upload, SampleSheetUpload.STATUS_FAILED, errors)
+
+    # Bulk update via API
+    updates = parsed['updates']
+    failed = []
+    if updates:
+        try:
+            results = limsfm_bulk_update_projectlines(
+                upload.project_uuid, updates, contacts=project['contacts'])
+        except requests.RequestException as e:
+            slack_message('portal/slack/limsfm_request_exception.slack',
+                          {'e': e, 'path': path})
+            return fail_upload(upload, LIMSFM_REQUEST_MESSAGE)
+
+        failed = [r for r in results if not r['ok']]
+        if len(failed) < len(results):
+            slack_message(
+                'portal/slack/limsfm_upload_sample_sheet_success.slack',
+                {'project': project,
+                 'update_count': len(results) - len(failed)})
+        if failed:
+            slack_message('portal/slack/limsfm_request_exception.slack',
+                          {'e': '%d of %d bulk projectline updates failed' %
+                                (len(failed), len(results)),
+                           'path': path})
+
+    errors = []
+    for r in failed:
+        errors.append({
+            'row': parsed['rows'][r['uuid']],
+            'message': ROW_NOT_SAVED_MESSAGE % {
+                'reason': r['reason'] or "LIMS unavailable"}})
+    errors.sort(key=lambda e: e['row'])
+    _finish(upload,
+            SampleSheetUpload.STATUS_FAILED if failed
+            else SampleSheetUpload.STATUS_DONE,
+            errors,
+            rows_updated=len(updates) - len(failed),
+            rows_unchanged=parsed['unchanged'])
+
+
+def upload_status_to_json(upload):
+    """Return the progress of an upload for the portal to poll"""
+    errors = json.loads(upload.errors) if upload.errors else []
+    messages = []
+    for e in errors[0:10]:  # Only report first 10
+        if e['row'] is None:
+            messages.append(e['message'])
+        else:
+            messages.append("Error on row %(row)d: %(message)s" %
+                            {'row': e['row'] + 1, 'message': e['message']})
+    return {
+        'job_id': str(upload.pk),
+        'status': upload.status,
+        'rows_total': upload.rows_total,
+        'rows_validated': upload.rows_validated,
+        'rows_updated': upload.rows_updated,
+        'rows_unchanged': upload.rows_unchanged,
+        'error_count': len(errors),
+        'errors': messages,
+        'message': ("%(unchanged)d unchanged, %(updated)d updated." %
+                    {'unchanged': upload.rows_unchanged,
+                     'updated': upload.rows_updated}),
+    }
@@ -0,0 +1,7 @@
+from mngweb.lookups import LookupTable
+from .models import EnvironmentalSampleType, HostSampleType
+
+
+host_sample_types = LookupTable(HostSampleType, 'host_sample_types')
+environmental_sample_types = LookupTable(
+    EnvironmentalSampleType, 'environmental_sample_types')
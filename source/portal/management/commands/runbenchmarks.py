@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from portal.benchmarks import BENCHMARKS
+
+
+class Command(BaseCommand):
+    help = """Runs the portal benchmarks (all of them, or those named) at
+              each size and prints their timings"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', metavar='name',
+                            help="One of: %s" % ', '.join(BENCHMARKS))
+        parser.add_argument(
+            '--sizes', type=int, nargs='+',
+            help="Sizes to run each benchmark at (default: each "
+                 "benchmark's own sizes)")
+
+    def handle(self, *args, **options):
+        names = options['names'] or list(BENCHMARKS)
+        unknown = [n for n in names if n not in BENCHMARKS]
+        if unknown:
+            raise CommandError('Unknown benchmark: %s' % ', '.join(unknown))
+
+        for name in names:
+            for size in options['sizes'] or BENCHMARKS[name].sizes:
+                try:
+                    results = BENCHMARKS[name](size)
+                except Exception as e:
+                    raise CommandError('An exception occurred: %s' % e)
+                self.stdout.write("%-24s %8d  %s" % (name, size, '  '.join(
+                    '%s=%s' % (k, ('%.3f' % v) if isinstance(v, float) else v)
+                    for k, v in results.items())))
+        self.stdout.write(self.style.SUCCESS("Benchmarks complete"))
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from portal.jobs import (LIMSFM_HTTP_MESSAGE, claim_next_upload,
+                         fail_upload, process_upload,
+                         requeue_interrupted_uploads)
+
+
+class Command(BaseCommand):
+    help = """Processes queued sample sheet uploads (validation and LIMSfm
+              import). Run a single worker alongside gunicorn."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Process the current queue, then exit")
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help="Seconds to wait between checks of an empty queue")
+
+    def handle(self, *args, **options):
+        requeued = requeue_interrupted_uploads()
+        if requeued:
+            self.stdout.write("Requeued %d interrupted uploads" % requeued)
+
+        while True:
+            close_old_connections()
+            upload = claim_next_upload()
+            if upload is None:
+                if options['once']:
+                    return
+                time.sleep(options['poll_interval'])
+                continue
+
+            self.stdout.write("Processing %s" % upload)
+            try:
+                process_upload(upload)
+            except Exception as e:
+                fail_upload(upload, LIMSFM_HTTP_MESSAGE)
+                self.stderr.write("Upload %s failed: %s" % (upload.pk, e))
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    "Finished %s" % upload))
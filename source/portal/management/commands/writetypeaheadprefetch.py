@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+from country.utils import write_countries_prefetch
+from organisation.utils import write_organisations_prefetch
+from portal.utils import write_sampletype_prefetch
+from taxon.utils import write_taxonomy_prefetch
+
+
+class Command(BaseCommand):
+    help = """Writes the typeahead prefetch files from the local database
+              (the sync commands also write them after each sync)"""
+
+    def handle(self, *args, **options):
+        try:
+            write_countries_prefetch()
+            write_organisations_prefetch()
+            write_sampletype_prefetch()
+            write_taxonomy_prefetch()
+        except Exception as e:
+            raise CommandError('An exception occurred: %s' % e)
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                "Successfully wrote typeahead prefetch files"))
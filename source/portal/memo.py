@@ -0,0 +1,73 @@
+"""Request-scoped memoisation of LIMSfm reads.
+
+The memo store lives on a thread local which LimsfmRequestMemoMiddleware
+resets at the start of every request, so identical reads made by the
+permission decorators and the views they wrap share one RESTfm round trip.
+Outside a request (management commands, shell) calls are not memoised.
+
+The same thread local carries the request's "bypass cache" flag, which lets
+staff force fresh LIMSfm reads past the shared project cache with ?nocache.
+"""
+import threading
+
+from functools import wraps
+
+
+_local = threading.local()
+
+
+def begin_request_memo(bypass_cache=False):
+    _local.store = {}
+    _local.bypass_cache = bypass_cache
+
+
+def end_request_memo():
+    _local.store = None
+    _local.bypass_cache = False
+
+
+def get_request_memo():
+    return getattr(_local, 'store', None)
+
+
+def request_bypasses_cache():
+    return getattr(_local, 'bypass_cache', False)
+
+
+def clear_request_memo():
+    """Forget memoised reads, e.g. after writing to LIMSfm"""
+    store = get_request_memo()
+    if store is not None:
+        store.clear()
+
+
+def request_memoized(func):
+    """Decorator: serve repeated calls with identical (hashable) args from
+       the current request's memo store"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        store = get_request_memo()
+        if store is None:
+            return func(*args, **kwargs)
+        key = (func.__name__,) + args + tuple(sorted(kwargs.items()))
+        try:
+            return store[key]
+        except KeyError:
+            result = store[key] = func(*args, **kwargs)
+            return result
+    return wrapper
+
+
+def submit_with_request_memo(executor, fn, *args):
+    """Submit fn to a thread pool, sharing the calling thread's memo store"""
+    store = get_request_memo()
+    bypass_cache = request_bypasses_cache()
+
+    def run():
+        _local.store = store
+        _local.bypass_cache = bypass_cache
+        try:
+            return fn(*args)
+        finally:
+            end_request_memo()
+    return executor.submit(run)
@@ -0,0 +1,15 @@
+from .memo import begin_request_memo, end_request_memo
+
+
+class LimsfmRequestMemoMiddleware(object):
+    """Give each request a fresh LIMSfm memo store (see portal.memo).
+       Staff can add ?nocache to a portal url to skip the shared LIMSfm
+       cache, which also refreshes it."""
+
+    def process_request(self, request):
+        begin_request_memo(
+            bypass_cache=request.user.is_staff and 'nocache' in request.GET)
+
+    def process_response(self, request, response):
+        end_request_memo()
+        return response
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0003_environmentalsampletype_hostsampletype'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SampleSheetUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('project_uuid', models.CharField(max_length=36)),
+                ('file_name', models.CharField(max_length=255)),
+                ('file_content', models.BinaryField(blank=True)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('rows_total', models.IntegerField(default=0)),
+                ('rows_validated', models.IntegerField(default=0)),
+                ('rows_updated', models.IntegerField(default=0)),
+                ('errors', models.TextField(blank=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['created'],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0004_samplesheetupload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='samplesheetupload',
+            name='rows_unchanged',
+            field=models.IntegerField(default=0),
+        ),
+    ]
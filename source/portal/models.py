@@ -1,5 +1,7 @@
 from __future__ import unicode_literals
 
+import uuid
+
 from django.db import models
 
 
@@ -15,3 +17,38 @@ class EnvironmentalSampleType(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class SampleSheetUpload(models.Model):
+    """An uploaded sample sheet, queued for validation and import by the
+       runsamplesheetworker management command"""
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    project_uuid = models.CharField(max_length=36)
+    file_name = models.CharField(max_length=255)
+    file_content = models.BinaryField(blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES,
+                              default=STATUS_QUEUED)
+    rows_total = models.IntegerField(default=0)
+    rows_validated = models.IntegerField(default=0)
+    rows_updated = models.IntegerField(default=0)
+    rows_unchanged = models.IntegerField(default=0)
+    errors = models.TextField(blank=True)  # json list of {row, message}
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['created']
+
+    def __str__(self):
+        return '{} ({})'.format(self.file_name, self.status)
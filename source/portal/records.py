@@ -0,0 +1,124 @@
+"""Compiled conversions of LIMSfm (FileMaker) records.
+
+compile_mapper() turns a {django name: FileMaker field} map and per-field
+converters into a single generated function that reads a whole record with
+one operator.itemgetter call. Mappers build plain dicts or Record objects,
+which keep their values in __slots__ but support the dict-style access
+that templates and the rest of the portal use.
+"""
+from operator import itemgetter
+
+
+def compile_mapper(field_map, converters=None, factory=dict):
+    """Return a function converting a FileMaker record (a dict keyed by
+       FileMaker field name) to a factory (dict or Record subclass) instance.
+
+    converters maps django names to functions applied to the raw FileMaker
+    value. The conversion of a complete record is generated as a single
+    function that reads every field with one itemgetter call and builds
+    the result in one expression (dict) or one assignment per slot
+    (Record). Records without some of the mapped fields (e.g. from a
+    layout that lacks them) are converted with those fields left out.
+    """
+    names = tuple(sorted(field_map))
+    fields = tuple(field_map[name] for name in names)
+    converters = converters or {}
+
+    namespace = {'new': object.__new__, 'cls': factory}
+    exprs = []
+    for i, name in enumerate(names):
+        if name in converters:
+            namespace['convert_%d' % i] = converters[name]
+            exprs.append('convert_%d(values[%d])' % (i, i))
+        else:
+            exprs.append('values[%d]' % i)
+    if factory is dict:
+        lines = ['    return {%s}' % ', '.join(
+            '%r: %s' % (name, expr) for name, expr in zip(names, exprs))]
+    else:
+        lines = (['    obj = new(cls)'] +
+                 ['    obj.%s = %s' % (name, expr)
+                  for name, expr in zip(names, exprs)] +
+                 ['    return obj'])
+    exec('\n'.join(['def build(values):'] + lines), namespace)
+    build = namespace['build']
+
+    getter = itemgetter(*fields)
+    if len(fields) == 1:
+        # itemgetter of a single item returns the value, not a tuple
+        getter = lambda record, get=getter: (get(record),)
+
+    def convert_partial(record):
+        present = [(name, record[field])
+                   for name, field in zip(names, fields) if field in record]
+        values = [converters[name](value) if name in converters else value
+                  for name, value in present]
+        present_names = [name for name, value in present]
+        if factory is dict:
+            return dict(zip(present_names, values))
+        return factory(present_names, values)
+
+    def mapper(record):
+        try:
+            values = getter(record)
+        except KeyError:
+            return convert_partial(record)
+        return build(values)
+
+    return mapper
+
+
+class Record(object):
+    """Base class for slotted records with dict-style access.
+
+    Subclasses list their keys in __slots__. Unset slots behave like keys
+    missing from a dict, and lookups of missing keys go through
+    __missing__, as they would for a dict subclass.
+    """
+    __slots__ = ()
+
+    def __init__(self, names, values):
+        for name, value in zip(names, values):
+            setattr(self, name, value)
+
+    def __missing__(self, key):
+        raise KeyError(key)
+
+    def __getitem__(self, key):
+        if key in self.__slots__:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                pass
+        return self.__missing__(key)
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.__slots__ and hasattr(self, key)
+
+    def __iter__(self):
+        return (key for key in self.__slots__ if hasattr(self, key))
+
+    def __len__(self):
+        return sum(1 for key in self)
+
+    def __repr__(self):
+        return '%s(%r)' % (type(self).__name__, dict(self))
+
+    def get(self, key, default=None):
+        if key in self:
+            return getattr(self, key)
+        return default
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        return [getattr(self, key) for key in self]
+
+    def items(self):
+        return [(key, getattr(self, key)) for key in self]
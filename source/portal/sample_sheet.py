@@ -1,12 +1,24 @@
+import csv
+import io
 import os
+import re
+import tempfile
+import zipfile
+from xml.sax.saxutils import escape
 
+import pyexcel
 from openpyxl import load_workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from openpyxl.utils import (
+    column_index_from_string, get_column_letter, range_boundaries)
+from openpyxl.utils.exceptions import IllegalCharacterError
 from openpyxl.worksheet.datavalidation import DataValidation
 
 from country.models import Country
 from country.utils import update_countries
+from .ebi_services import ebi_search_taxonomy_by_ids
 from .forms import ProjectLineForm
-from .services import limsfm_get_project
+from .services import limsfm_get_project, projectline_has_changes
 
 
 SAMPLE_SHEET_COL_ORDER = [
@@ -31,98 +43,355 @@ SAMPLE_SHEET_COL_ORDER = [
 ]
 
 
-def create_sample_sheet(project_uuid):
-    """Create sample sheet with 'initial data' for project"""
-    wb = load_workbook(os.path.join(
-        os.path.dirname(__file__),
-        'static/portal/excel/mng_excel_template.xlsx'))
-    ws = wb['Data']
+SAMPLE_SHEET_TEMPLATE_PATH = os.path.join(
+    os.path.dirname(__file__), 'static/portal/excel/mng_excel_template.xlsx')
 
-    project = limsfm_get_project(project_uuid)
+SAMPLE_SHEET_HEADER_ROW = 3
+SAMPLE_SHEET_FIRST_ROW = 7
+SAMPLE_SHEET_BLANK_ROWS = 20  # consecutive blank rows ending the data
 
-    ws['F1'] = project['reference']
-    data_rows = list(ws.iter_rows(min_row=7))
+# (column, lookup formula, error title, error message)
+SAMPLE_SHEET_LIST_VALIDATIONS = [
+    ('J', '=Lookups!$B$1:$B$267', "Invalid country",
+     "Please select a country from the list"),
+    ('Q', '=Lookups!$C$1:$C$31', "Invalid environmental sample type",
+     "Please select a environmental sample type from the list"),
+    ('L', '=Lookups!$E$1:$E$5', "Invalid lab experiment type",
+     "Please select a lab experiment type from the list"),
+    ('O', '=Lookups!$D$1:$D$67', "Invalid host sample type",
+     "Please select a host sample type from the list"),
+]
 
+SPOOL_MAX_SIZE = 1024 * 1024  # sample sheets larger than this spool to disk
+
+_template = {}
+
+_ROW_RE = re.compile(r'<row\b([^>/]*)(?:/>|>(.*?)</row>)', re.S)
+_CELL_RE = re.compile(r'<c\b([^>/]*)(?:/>|>.*?</c>)', re.S)
+_ROW_NUMBER_RE = re.compile(r'\br="(\d+)"')
+_CELL_COLUMN_RE = re.compile(r'\br="([A-Z]+)\d+"')
+_CELL_STYLE_RE = re.compile(r'\bs="(\d+)"')
+_DIMENSION_RE = re.compile(r'(<dimension ref="[A-Z]+\d+:[A-Z]+)(\d+)')
+_VALIDATIONS_RE = re.compile(r'<dataValidations\b.*?</dataValidations>', re.S)
+_SQREF_RE = re.compile(r'\bsqref="([^"]*)"')
+
+
+def _sheet_rows(sheet_data):
+    """Return {row: (row tag, {column: (cell xml, style)})} for the rows of
+       a worksheet's <sheetData>, as written by openpyxl"""
+    rows = {}
+    for match in _ROW_RE.finditer(sheet_data):
+        attrs, content = match.group(1).rstrip(), match.group(2) or ''
+        cells = {}
+        for cell in _CELL_RE.finditer(content):
+            column = column_index_from_string(
+                _CELL_COLUMN_RE.search(cell.group(1)).group(1))
+            style = _CELL_STYLE_RE.search(cell.group(1))
+            cells[column] = (cell.group(0), style and style.group(1))
+        row = int(_ROW_NUMBER_RE.search(attrs).group(1))
+        rows[row] = ('<row%s>' % attrs, cells)
+    return rows
+
+
+def _get_template():
+    """Return the sample sheet template, given its list validations, as the
+       members of its .xlsx package with the Data sheet split into rows,
+       prepared once per process (and again if updatesamplesheet has
+       regenerated the file). Each download writes a new package from
+       these, so nothing written for one project can reach another's."""
+    mtime = os.path.getmtime(SAMPLE_SHEET_TEMPLATE_PATH)
+    template = _template.get('template')
+    if template is None or template['mtime'] != mtime:
+        wb = load_workbook(SAMPLE_SHEET_TEMPLATE_PATH)
+        ws = wb['Data']
+        last_row = ws.max_row
+        for col, formula, title, error in SAMPLE_SHEET_LIST_VALIDATIONS:
+            validator = DataValidation(
+                type='list', formula1=formula, allow_blank=True)
+            validator.error = error
+            validator.errorTitle = title
+            ws.add_data_validation(validator)
+            validator.ranges.add('%(col)s%(first)d:%(col)s%(last)d' %
+                                 {'col': col, 'first': SAMPLE_SHEET_FIRST_ROW,
+                                  'last': last_row})
+        content = io.BytesIO()
+        wb.save(content)
+        sheet_path = ws.path[1:]  # set by save
+        with zipfile.ZipFile(content) as package:
+            members = [(name, package.read(name))
+                       for name in package.namelist()]
+        sheet = dict(members)[sheet_path].decode('utf-8')
+        data_start = sheet.index('<sheetData>') + len('<sheetData>')
+        data_end = sheet.index('</sheetData>')
+        template = {'mtime': mtime, 'members': members,
+                    'sheet_path': sheet_path, 'last_row': last_row,
+                    'head': sheet[:data_start],
+                    'rows': _sheet_rows(sheet[data_start:data_end]),
+                    'tail': sheet[data_end:]}
+        _template['template'] = template
+    return template
+
+
+def _cell_xml(column, row, style, value):
+    """Return the <c> element for a cell; strings are written inline, so
+       the template's shared strings are left as they are"""
+    attrs = ' r="%s%d"' % (get_column_letter(column), row)
+    if style is not None:
+        attrs += ' s="%s"' % style
+    if value is None or value == '':
+        return '<c%s/>' % attrs
+    if isinstance(value, str):
+        if ILLEGAL_CHARACTERS_RE.search(value):
+            raise IllegalCharacterError
+        return ('<c%s t="inlineStr"><is><t xml:space="preserve">%s</t></is>'
+                '</c>' % (attrs, escape(value)))
+    return '<c%s><v>%r</v></c>' % (attrs, value)
+
+
+def _resize_sqref(match, last_row):
+    """Extend a data validation's ranges that start on the first data row
+       to end on last_row"""
+    cols = []
+    for cell_range in match.group(1).split():
+        min_col, min_row = range_boundaries(cell_range)[:2]
+        if min_row == SAMPLE_SHEET_FIRST_ROW:
+            cols.append(get_column_letter(min_col))
+    if not cols:
+        return match.group(0)
+    return 'sqref="%s"' % ' '.join(
+        '%(col)s%(first)d:%(col)s%(last)d' %
+        {'col': col, 'first': SAMPLE_SHEET_FIRST_ROW, 'last': last_row}
+        for col in cols)
+
+
+def _projectline_cells(pl):
+    """Yield (column, value) for the cells of a projectline's sheet row"""
+    yield 2, pl['sample_ref']
+
+    if pl['customers_ref']:
+        yield 3, pl['customers_ref']
+        if pl['dna_concentration_ng_ul']:
+            yield 4, float(pl['dna_concentration_ng_ul'])
+        if pl['volume_ul']:
+            yield 5, float(pl['volume_ul'])
+        yield 6, pl['taxon_id']
+        if pl['collection_day']:
+            yield 7, int(pl['collection_day'])
+        if pl['collection_month']:
+            yield 8, int(pl['collection_month'])
+        if pl['collection_year']:
+            yield 9, int(pl['collection_year'])
+        yield 10, pl['geo_country_name']
+        yield 11, pl['geo_specific_location']
+
+        if pl['study_type'] == "Lab":
+            yield 12, pl['lab_experiment_type']
+            yield 13, pl['further_details']
+        elif pl['study_type'] == "Host":
+            yield 14, pl['host_taxon_id']
+            yield 15, pl['host_sample_type']
+            yield 16, pl['further_details']
+        elif pl['study_type'] == "Environmental":
+            yield 17, pl['environmental_sample_type']
+            yield 18, pl['further_details']
+
+
+def write_sample_sheet(project, fileobj):
+    """Write the sample sheet for project, with 'initial data', to fileobj.
+
+    Projects with more lines than the template has rows get extra rows
+    styled like its last row, and the data validations are sized to cover
+    every row.
+    """
+    template = _get_template()
+    template_rows = template['rows']
+    template_last_row = template['last_row']
+    last_row = max(template_last_row, SAMPLE_SHEET_FIRST_ROW +
+                   len(project['projectlines']) - 1)
+
+    values = {1: {6: project['reference']}}
     for i, pl in enumerate(project['projectlines']):
-        row = data_rows[i]
-
-        row[1].value = pl['sample_ref']
-
-        if pl['customers_ref']:
-            row[2].value = pl['customers_ref']
-            if pl['dna_concentration_ng_ul']:
-                row[3].value = float(pl['dna_concentration_ng_ul'])
-            if pl['volume_ul']:
-                row[4].value = float(pl['volume_ul'])
-            row[5].value = pl['taxon_id']
-            if pl['collection_day']:
-                row[6].value = int(pl['collection_day'])
-            if pl['collection_month']:
-                row[7].value = int(pl['collection_month'])
-            if pl['collection_year']:
-                row[8].value = int(pl['collection_year'])
-            row[9].value = pl['geo_country_name']
-            row[10].value = pl['geo_specific_location']
-
-            if pl['study_type'] == "Lab":
-                row[11].value = pl['lab_experiment_type']
-                row[12].value = pl['further_details']
-            elif pl['study_type'] == "Host":
-                row[13].value = pl['host_taxon_id']
-                row[14].value = pl['host_sample_type']
-                row[15].value = pl['further_details']
-            elif pl['study_type'] == "Environmental":
-                row[16].value = pl['environmental_sample_type']
-                row[17].value = pl['further_details']
-
-    # Country list validation
-    country_validator = DataValidation(
-        type='list', formula1='=Lookups!$B$1:$B$267', allow_blank=True)
-    country_validator.error = "Please select a country from the list"
-    country_validator.errorTitle = "Invalid country"
-    ws.add_data_validation(country_validator)
-    country_validator.ranges.add('J7:J1000')
-
-    # Environmental sample type list validation
-    est_validator = DataValidation(
-        type='list', formula1='=Lookups!$C$1:$C$31', allow_blank=True)
-    est_validator.error = ("Please select a environmental sample type from "
-                           "the list")
-    est_validator.errorTitle = "Invalid environmental sample type"
-    ws.add_data_validation(est_validator)
-    est_validator.ranges.add('Q7:Q1000')
-
-    # Lab experiment type list validation
-    lab_validator = DataValidation(
-        type='list', formula1='=Lookups!$E$1:$E$5', allow_blank=True)
-    lab_validator.error = "Please select a lab experiment type from the list"
-    lab_validator.errorTitle = "Invalid lab experiment type"
-    ws.add_data_validation(lab_validator)
-    lab_validator.ranges.add('L7:L1000')
-
-    # Host sample type list validation
-    hst_validator = DataValidation(
-        type='list', formula1='=Lookups!$D$1:$D$67', allow_blank=True)
-    hst_validator.error = "Please select a host sample type from the list"
-    hst_validator.errorTitle = "Invalid host sample type"
-    ws.add_data_validation(hst_validator)
-    hst_validator.ranges.add('O7:O1000')
-
-    return wb
-
-
-def parse_sample_sheet(project, sheet):
-    """Parse uploaded sample sheet data; return errors and updates"""
+        values[SAMPLE_SHEET_FIRST_ROW + i] = dict(_projectline_cells(pl))
+    last_cells = template_rows.get(template_last_row, (None, {}))[1]
+    extra_cells = dict((col, (None, style))
+                       for col, (xml, style) in last_cells.items()
+                       if col <= len(SAMPLE_SHEET_COL_ORDER))
+
+    parts = [_DIMENSION_RE.sub(
+        lambda m: m.group(1) + str(max(int(m.group(2)), last_row)),
+        template['head'], count=1)]
+    for row in sorted(set(template_rows) | set(values)):
+        if row in template_rows:
+            tag, cells = template_rows[row]
+        else:
+            tag = '<row r="%d">' % row
+            cells = extra_cells if row > template_last_row else {}
+        row_values = values.get(row, {})
+        parts.append(tag)
+        for col in sorted(set(cells) | set(row_values)):
+            xml, style = cells.get(col, (None, None))
+            if col in row_values:
+                xml = _cell_xml(col, row, style, row_values[col])
+            elif xml is None:
+                xml = _cell_xml(col, row, style, None)
+            parts.append(xml)
+        parts.append('</row>')
+    # Resize the validations covering the data rows
+    parts.append(_VALIDATIONS_RE.sub(
+        lambda m: _SQREF_RE.sub(lambda s: _resize_sqref(s, last_row),
+                                m.group(0)),
+        template['tail'], count=1))
+
+    with zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_DEFLATED) as package:
+        for name, data in template['members']:
+            if name == template['sheet_path']:
+                data = ''.join(parts).encode('utf-8')
+            package.writestr(name, data)
+
+
+def create_sample_sheet(project_uuid):
+    """Create sample sheet with 'initial data' for project. Returns a
+       spooled temporary file positioned at the start of the .xlsx data"""
+    project = limsfm_get_project(project_uuid)
+    fileobj = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    write_sample_sheet(project, fileobj)
+    fileobj.seek(0)
+    return fileobj
+
+
+class SampleSheetFileException(Exception):
+    pass
+
+
+class SampleSheetHeadersException(Exception):
+    pass
+
+
+def _row_values(values):
+    """Normalise a row read from an uploaded sheet to SAMPLE_SHEET_COL_ORDER
+       width, with empty cells as ''"""
+    width = len(SAMPLE_SHEET_COL_ORDER)
+    values = ['' if v is None else v for v in values[:width]]
+    values.extend([''] * (width - len(values)))
+    return values
+
+
+def _iter_xlsx_values(content):
+    # read_only parses the worksheet XML as it is iterated, without
+    # loading styles or the rest of the workbook into memory
+    wb = load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+    ws = wb['Data'] if 'Data' in wb.sheetnames else wb.active
+    for cells in ws.iter_rows(max_col=len(SAMPLE_SHEET_COL_ORDER)):
+        yield _row_values([cell.value for cell in cells])
+
+
+def _iter_csv_values(content, delimiter):
+    f = io.TextIOWrapper(io.BytesIO(content), encoding='utf-8-sig',
+                         errors='replace', newline='')
+    for values in csv.reader(f, delimiter=delimiter):
+        yield _row_values([v.strip() for v in values])
+
+
+def _iter_pyexcel_values(content, file_type):
+    try:
+        for values in pyexcel.iget_array(
+                file_type=file_type, file_content=content):
+            yield _row_values(values)
+    finally:
+        pyexcel.free_resources()
+
+
+def _iter_sheet_values(content, file_type):
+    if file_type in ('xlsx', 'xlsm'):
+        return _iter_xlsx_values(content)
+    if file_type == 'csv':
+        return _iter_csv_values(content, ',')
+    if file_type == 'tsv':
+        return _iter_csv_values(content, '\t')
+    return _iter_pyexcel_values(content, file_type)
+
+
+def _iter_data_rows(rows):
+    blank = 0
+    try:
+        for row, values in rows:
+            if row < SAMPLE_SHEET_FIRST_ROW - 1:
+                continue
+            if not any(str(v).strip() for v in values):
+                blank += 1
+                if blank >= SAMPLE_SHEET_BLANK_ROWS:
+                    break
+                continue
+            blank = 0
+            yield row, values
+    except Exception as e:
+        # Corrupt data past the headers only shows up as rows are read
+        raise SampleSheetFileException(e)
+
+
+def read_sample_sheet(content, file_type):
+    """Check the headers of uploaded sample sheet content and return an
+       iterator of (row index, values) for its data rows.
+
+    Rows are read lazily, and reading stops at the first
+    SAMPLE_SHEET_BLANK_ROWS blank rows, so the size of the file's
+    formatting or padding does not matter. Raises
+    SampleSheetHeadersException if the headers do not match the template
+    and SampleSheetFileException (here or while iterating) if the file
+    cannot be read.
+    """
+    try:
+        rows = enumerate(_iter_sheet_values(content, file_type))
+        header = next((values for row, values in rows
+                       if row == SAMPLE_SHEET_HEADER_ROW - 1), None)
+    except Exception as e:
+        raise SampleSheetFileException(e)
+    if header is None or header[-1] != 'Further details':
+        raise SampleSheetHeadersException
+    return _iter_data_rows(rows)
+
+
+def _taxid_str(value):
+    """Normalise a sheet taxid cell the way ProjectLineForm will clean it"""
+    if value in (None, ''):
+        return ''
+    return str(value).strip()
+
+
+def _iter_validated_rows(pending, projectlines, taxa):
+    """Validate pending (row, sample_ref, row_data) sheet rows; yield
+       (row, projectline, cleaned_data or None, errors) for each"""
+    for row, sample_ref, row_data in pending:
+        projectline = projectlines[sample_ref]
+        # Pass row data to form
+        row_data['aliquottype_name'] = projectline['aliquottype_name']
+        form = ProjectLineForm(row_data, taxa=taxa)
+        if form.is_valid():
+            yield row, projectline, form.cleaned_data, None
+        else:
+            yield row, projectline, None, form.errors
+
+
+def parse_sample_sheet(project, rows, progress=None):
+    """Parse uploaded sample sheet rows (as returned by read_sample_sheet);
+       return errors, updates (only rows that differ from the project's
+       current projectlines), the row of each update and the count of
+       unchanged rows. progress, if given, is called as
+       progress(rows_validated, rows_total) as rows are validated"""
 
     projectlines = {}
     for pl in project['projectlines']:
         projectlines[pl['sample_ref']] = pl
 
     updates = {}
+    update_rows = {}
+    unchanged = 0
     errors = []
+    pending = []
+    taxids = set()
 
-    for row in sheet.row_range()[6:1000]:
-        row_data = dict(zip(SAMPLE_SHEET_COL_ORDER, sheet.row[row]))
+    for row, values in rows:
+        row_data = dict(zip(SAMPLE_SHEET_COL_ORDER, values))
         sample_ref = str(row_data['sample_ref'])
 
         # Skip 'blank' rows
@@ -158,26 +427,43 @@ def parse_sample_sheet(project, sheet):
         elif has_host_meta:
             row_data['study_type'] = 'Host'
             row_data['further_details'] = row_data['host_further_details']
+            taxids.add(_taxid_str(row_data['host_taxon_id']))
         elif has_env_meta:
             row_data['study_type'] = 'Environmental'
             row_data['further_details'] = row_data['env_further_details']
-
-        # Pass row data to form
-        row_data['aliquottype_name'] = (projectlines[sample_ref]
-                                        ['aliquottype_name'])
-        form = ProjectLineForm(row_data)
-        if form.is_valid():
-            uuid = projectlines[sample_ref]['uuid']
-            updates[uuid] = form.cleaned_data
+        taxids.add(_taxid_str(row_data['taxon_id']))
+
+        pending.append((row, sample_ref, row_data))
+
+    # Resolve every distinct taxon id in the sheet at once
+    taxids.discard('')
+    taxa = ebi_search_taxonomy_by_ids(taxids) if taxids else {}
+
+    if progress:
+        progress(0, len(pending))
+
+    validated = 0
+    for row, projectline, cleaned_data, form_errors in _iter_validated_rows(
+            pending, projectlines, taxa):
+        if form_errors:
+            for col in form_errors:
+                errors.append({'row': row, 'message': form_errors[col][0]})
+        elif projectline_has_changes(projectline, cleaned_data):
+            updates[projectline['uuid']] = cleaned_data
+            update_rows[projectline['uuid']] = row
         else:
-            for i, col in enumerate(form.errors):
-                errors.append(
-                    {'row': row, 'message': form.errors[col][0]})
+            unchanged += 1
+        validated += 1
+        if progress:
+            progress(validated, len(pending))
+
+    errors.sort(key=lambda e: e['row'])
 
-    if not (errors or updates):
+    if not (errors or updates or unchanged):
         errors.append({'row': 0, 'message': "No rows to update."})
 
-    return {'errors': errors, 'updates': updates}
+    return {'errors': errors, 'updates': updates, 'rows': update_rows,
+            'unchanged': unchanged}
 
 
 def update_sample_sheet_template():
@@ -1,13 +1,24 @@
 import json
+import os
+import threading
+import time
+
 import requests
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
 from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
 from django.utils.http import urlquote
 
 from urllib.parse import urljoin
 
 from .forms import ProjectLineForm
+from .records import Record, compile_mapper
+from .memo import (clear_request_memo, request_bypasses_cache,
+                   request_memoized, submit_with_request_memo)
 
 
 PROJECT_DJANGO_TO_LIMSFM_MAP = {
@@ -74,28 +85,66 @@ PROJECTLINE_LIMSFM_TO_DJANGO_MAP = {
     v: k for k, v in PROJECTLINE_DJANGO_TO_LIMSFM_MAP.items()}
 
 
-def date_from_fmstr(dct, key):
-    """Convert a filemaker date string to a datetime.date object, in place"""
-    if dct[key]:
-        dct[key] = datetime.strptime(dct[key], '%m/%d/%Y')
+FM_DATE_CACHE_SIZE = 4096  # distinct date/datetime strings kept parsed
+
+# Bulk update responses meaning LIMSfm rejected some of a chunk's records,
+# and ones worth sending again (429 Too Many Requests, and any 5xx)
+BULK_SPLIT_STATUSES = (400, 409, 422)
+BULK_RETRY_STATUSES = (429,)
+
+
+@lru_cache(maxsize=FM_DATE_CACHE_SIZE)
+def _parse_fm_date(value):
+    # Fast path for the MM/DD/YYYY layout FileMaker emits; anything else
+    # (e.g. unpadded months) goes through strptime
+    if len(value) == 10 and value[2] == value[5] == '/':
+        try:
+            return datetime(int(value[6:]), int(value[:2]), int(value[3:5]))
+        except ValueError:
+            pass
+    return datetime.strptime(value, '%m/%d/%Y')
+
+
+@lru_cache(maxsize=FM_DATE_CACHE_SIZE)
+def _parse_fm_datetime(value):
+    # Fast path for MM/DD/YYYY HH:MM:SS, as _parse_fm_date
+    if (len(value) == 19 and value[2] == value[5] == '/' and
+            value[10] == ' ' and value[13] == value[16] == ':'):
+        try:
+            return datetime(int(value[6:10]), int(value[:2]), int(value[3:5]),
+                            int(value[11:13]), int(value[14:16]),
+                            int(value[17:]))
+        except ValueError:
+            pass
+    return datetime.strptime(value, '%m/%d/%Y %H:%M:%S')
 
 
-def datetime_from_fmstr(dct, key):
-    """Convert a filemaker date string to a datetime object, in place"""
-    if dct[key]:
-        dct[key] = datetime.strptime(dct[key], '%m/%d/%Y %H:%M:%S')
+def date_from_fmstr(value):
+    """Convert a filemaker date string to a datetime.date object"""
+    if value:
+        return _parse_fm_date(value)
+    return value
 
 
-def bool_from_fmstr(dct, key):
-    """Convert a filemaker boolean value, in place"""
-    if dct[key]:
-        dct[key] = bool(int(dct[key]))
+def datetime_from_fmstr(value):
+    """Convert a filemaker date string to a datetime object"""
+    if value:
+        return _parse_fm_datetime(value)
+    return value
 
 
-def list_from_fmstr(dct, key):
-    """Convert a filemaker return-separated list, in place"""
-    if dct[key]:
-        dct[key] = dct[key].split('\n')
+def bool_from_fmstr(value):
+    """Convert a filemaker boolean value"""
+    if value:
+        return bool(int(value))
+    return value
+
+
+def list_from_fmstr(value):
+    """Convert a filemaker return-separated list"""
+    if value:
+        return value.split('\n')
+    return value
 
 
 def value_to_fm_type(value):
@@ -106,23 +155,23 @@ def value_to_fm_type(value):
     return str(value)
 
 
-def project_from_limsfm(limsfm_project):
-    project = {}
+_project_from_record = compile_mapper(
+    PROJECT_DJANGO_TO_LIMSFM_MAP,
+    {
+        'all_content_received_date': date_from_fmstr,
+        'barcodes_sent_date': date_from_fmstr,
+        'creation_datetime': datetime_from_fmstr,
+        'data_sent_date': date_from_fmstr,
+        'has_dna_samples': bool_from_fmstr,
+        'has_strain_samples': bool_from_fmstr,
+        'portal_login_required': bool_from_fmstr,
+    })
 
-    for d, f in PROJECT_DJANGO_TO_LIMSFM_MAP.items():
-        if f in limsfm_project:
-            project[d] = limsfm_project[f]
 
-    date_from_fmstr(project, 'all_content_received_date')
-    datetime_from_fmstr(project, 'creation_datetime')
-    date_from_fmstr(project, 'data_sent_date')
-    bool_from_fmstr(project, 'has_dna_samples')
-    bool_from_fmstr(project, 'has_strain_samples')
-    bool_from_fmstr(project, 'portal_login_required')
+def project_from_limsfm(limsfm_project):
+    project = _project_from_record(limsfm_project)
 
-    if project['barcodes_sent_date']:
-        date_from_fmstr(project, 'barcodes_sent_date')
-    else:
+    if not project['barcodes_sent_date']:
         project['barcodes_sent_date'] = project['creation_datetime'].date()
 
     if project['results_path'] and project['url_template']:
@@ -136,14 +185,23 @@ def project_from_limsfm(limsfm_project):
     return project
 
 
-def projectline_from_limsfm(limsfm_projectline):
-    projectline = {}
-    for d, f in PROJECTLINE_DJANGO_TO_LIMSFM_MAP.items():
-        if f in limsfm_projectline:
-            projectline[d] = limsfm_projectline[f]
-    bool_from_fmstr(projectline, 'is_confidential')
-    projectline['form'] = ProjectLineForm(initial=projectline)
-    return projectline
+class ProjectLine(Record):
+    """A projectline record, whose 'form' (a ProjectLineForm with the
+       projectline as initial data) is only built when first looked up,
+       e.g. by a template rendering pl.form"""
+    __slots__ = tuple(sorted(PROJECTLINE_DJANGO_TO_LIMSFM_MAP)) + ('form',)
+
+    def __missing__(self, key):
+        if key != 'form':
+            raise KeyError(key)
+        self.form = ProjectLineForm(initial=dict(self))
+        return self.form
+
+
+projectline_from_limsfm = compile_mapper(
+    PROJECTLINE_DJANGO_TO_LIMSFM_MAP,
+    {'is_confidential': bool_from_fmstr},
+    factory=ProjectLine)
 
 
 def projectline_to_fm_dict(project_uuid, cleaned_data):
@@ -165,35 +223,169 @@ def projectline_to_fm_dict(project_uuid, cleaned_data):
     return fm_data
 
 
-def limsfm_request(rel_uri, method='get', params={}, json=None):
-    """Send an API request to LIMSfm (RESTfm).
+def _fm_value_matches(value, fm_value):
+    """Compare a value bound for FileMaker with a current FileMaker value"""
+    value = value_to_fm_type(value)
+    if fm_value is None:
+        fm_value = ''
+    if isinstance(value, (int, float)):
+        try:
+            return float(fm_value) == value
+        except ValueError:
+            return False
+    return value == str(fm_value)
+
+
+def projectline_has_changes(projectline, cleaned_data):
+    """Return True if saving ProjectLineForm cleaned_data would change the
+       projectline's current LIMSfm values"""
+    data = dict(cleaned_data)
+    geo_country = data.pop('geo_country_name', None)
+    data['geo_country'] = geo_country.iso2 if geo_country else ''
+    for k, v in data.items():
+        if (k in PROJECTLINE_DJANGO_TO_LIMSFM_MAP and
+                not _fm_value_matches(v, projectline.get(k))):
+            return True
+    return False
+
+
+class LimsfmClient(object):
+    """Long-lived LIMSfm (RESTfm) API client.
+
+    Holds a single requests.Session with a pooled, keep-alive HTTP adapter so
+    repeated calls from the same worker reuse their TCP/TLS connections.
+    """
+
+    def __init__(self, base_url, key, pool_size=10, timeout=60, timeouts=None):
+        self.base_url = base_url
+        self.key = key
+        self.timeout = timeout
+        # Longest matching rel_uri prefix wins, e.g. {'bulk/': 120}
+        self.timeouts = sorted((timeouts or {}).items(),
+                               key=lambda t: len(t[0]), reverse=True)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def timeout_for(self, rel_uri):
+        for prefix, timeout in self.timeouts:
+            if rel_uri.startswith(prefix):
+                return timeout
+        return self.timeout
+
+    def request(self, rel_uri, method='get', params=None, json=None,
+                timeout=None):
+        """Send an API request to LIMSfm (RESTfm).
+           Returns a response object or raises an exception"""
+        params = dict(params or {})
+        params['RFMkey'] = self.key
+        uri = "%(base)s%(rel_uri)s.json" % {
+            'base': self.base_url, 'rel_uri': rel_uri}
+        response = self.session.request(
+            method, uri, params=params, json=json,
+            timeout=timeout or self.timeout_for(rel_uri))
+        response.raise_for_status()
+        return response
+
+
+_limsfm_client = None
+_limsfm_client_lock = threading.Lock()
+
+
+def get_limsfm_client():
+    """Return the LimsfmClient for this worker process, creating it on first
+       use (and again after a fork, so workers never share sockets)"""
+    global _limsfm_client
+    client = _limsfm_client
+    if client is None or client.pid != os.getpid():
+        with _limsfm_client_lock:
+            client = _limsfm_client
+            if client is None or client.pid != os.getpid():
+                client = LimsfmClient(
+                    settings.RESTFM_BASE_URL,
+                    settings.RESTFM_KEY,
+                    pool_size=getattr(settings, 'RESTFM_POOL_SIZE', 10),
+                    timeout=getattr(settings, 'RESTFM_TIMEOUT', 60),
+                    timeouts=getattr(settings, 'RESTFM_TIMEOUTS', None))
+                client.pid = os.getpid()
+                _limsfm_client = client
+    return client
+
+
+_limsfm_executor = None
+_limsfm_executor_pid = None
+
+
+def get_limsfm_executor():
+    """Return the thread pool this worker uses for concurrent LIMSfm calls"""
+    global _limsfm_executor, _limsfm_executor_pid
+    if _limsfm_executor is None or _limsfm_executor_pid != os.getpid():
+        with _limsfm_client_lock:
+            if (_limsfm_executor is None or
+                    _limsfm_executor_pid != os.getpid()):
+                _limsfm_executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'RESTFM_FETCH_WORKERS', 4))
+                _limsfm_executor_pid = os.getpid()
+    return _limsfm_executor
+
+
+def limsfm_request(rel_uri, method='get', params=None, json=None,
+                   timeout=None):
+    """Send an API request to LIMSfm (RESTfm) via the worker's pooled client.
        Returns a response object or raises an exception"""
+    return get_limsfm_client().request(
+        rel_uri, method, params=params, json=json, timeout=timeout)
 
-    params['RFMkey'] = settings.RESTFM_KEY
-    uri = (
-        "%(base)s%(rel_uri)s.json" %
-        {'base': settings.RESTFM_BASE_URL, 'rel_uri': rel_uri}
-    )
-    s = requests.Session()
-    prepped_request = requests.Request(
-        method, uri, params=params, json=json).prepare()
-    response = s.send(prepped_request, timeout=60)
-    response.raise_for_status()
 
-    return response
+def limsfm_project_cache_key(uuid):
+    return 'limsfm_project_{}'.format(uuid)
 
 
-def limsfm_get_contact(email):
-    # Get LIMSfm contact data
+def limsfm_contact_cache_key(email):
+    return 'limsfm_contact_{}'.format(email.lower())
+
+
+def limsfm_cache_generation_key(key):
+    return '{}__generation'.format(key)
+
+
+def limsfm_cache_get(key):
+    """Read from the shared LIMSfm cache. Returns (value, generation): value
+       is None on a miss, if the entry predates the key's last eviction, or
+       if a staff user asked this request to bypass the cache (?nocache);
+       pass generation to limsfm_cache_set() when filling the key"""
+    generation_key = limsfm_cache_generation_key(key)
+    values = cache.get_many([key, generation_key])
+    generation = values.get(generation_key, 0)
+    entry = values.get(key)
+    if (entry is None or entry[0] != generation or
+            request_bypasses_cache()):
+        return None, generation
+    return entry[1], generation
+
+
+def limsfm_cache_set(key, value, generation):
+    """Cache value, read from LIMSfm under generation, unless the key has
+       been evicted (by a write) since: the value may predate that write"""
+    if cache.get(limsfm_cache_generation_key(key), 0) != generation:
+        return
+    cache.set(key, (generation, value),
+              getattr(settings, 'LIMSFM_CACHE_TIMEOUT', 300))
+
+
+@request_memoized
+def _limsfm_get_contact_records(email):
+    """Return the raw contact record and its project records"""
     response = limsfm_request(
         'layout/contact_api/%(field)s%(value)s' %
         {
             'field': urlquote('email_address==='),
             'value': urlquote(email)
         }, 'get')
-    contact = response.json()['data'][0]
+    records = {'contact': response.json()['data'][0], 'projects': []}
 
-    # Get related projects
     try:
         response = limsfm_request('layout/project_api', 'get', {
             'RFMsF1': 'Contact::email_address',
@@ -203,54 +395,66 @@ def limsfm_get_contact(email):
     except requests.HTTPError as e:
         if (e.response.status_code == 500 and
                 e.response.headers['X-RESTfm-FM-Status'] == '401'):
-            contact['projects'] = []  # no projects found for contact
+            pass  # no projects found for contact
         else:
             raise  # unexpected
     else:
-        project_records = response.json()['data']
-        contact['projects'] = []
-        for record in project_records:
-            contact['projects'].append(project_from_limsfm(record))
-
-        contact['projects'].sort(
-            key=lambda k: (
-                0 - datetime.combine(
-                    k['barcodes_sent_date'], datetime.min.time()).timestamp(),
-                k['first_plate_barcode'],
-                k['reference'],
-            ))
+        records['projects'] = response.json()['data']
+
+    return records
+
+
+@request_memoized
+def limsfm_get_contact(email):
+    key = limsfm_contact_cache_key(email)
+    records, generation = limsfm_cache_get(key)
+    if records is None:
+        records = _limsfm_get_contact_records(email)
+        limsfm_cache_set(key, records, generation)
+
+    contact = dict(records['contact'])
+    contact['projects'] = []
+    for record in records['projects']:
+        contact['projects'].append(project_from_limsfm(record))
+
+    # Newest first; toordinal() orders by day like the midnight timestamp
+    contact['projects'].sort(
+        key=lambda k: (
+            -k['barcodes_sent_date'].toordinal(),
+            k['first_plate_barcode'],
+            k['reference'],
+        ))
 
     return contact
 
 
-def limsfm_get_project_permissions(uuid):
-    """
-    Return a project permissions dictionary (lightweight, single api call).
-    Can be merged with a full project dictionary via dict.update()
-    """
-    permissions = {
-        'uuid': uuid,
-        'portal_login_required': False,
-        'contacts': [],
-    }
+@request_memoized
+def _limsfm_get_project_contact_records(uuid):
     response = limsfm_request('layout/project_contact_api', 'get', {
         'RFMsF1': 'Project::uuid',
         'RFMsV1': uuid,
         'RFMmax': 0
     })
-    records = response.json()['data']
+    return response.json()['data']
 
-    permissions['portal_login_required'] = records[0]['Project::portal_login_required']
-    bool_from_fmstr(permissions, 'portal_login_required')
 
-    for r in response.json()['data']:
+def permissions_from_limsfm(uuid, records):
+    permissions = {
+        'uuid': uuid,
+        'portal_login_required': False,
+        'contacts': [],
+    }
+
+    permissions['portal_login_required'] = bool_from_fmstr(
+        records[0]['Project::portal_login_required'])
+
+    for r in records:
         c = {
             'uuid': r['Contact::uuid'],
             'email': r['Contact::email_address'],
-            'is_primary': r['unstored_is_primary'],
+            'is_primary': bool_from_fmstr(r['unstored_is_primary']),
             'name': r['Contact::name_full']
         }
-        bool_from_fmstr(c, 'is_primary')
         permissions['contacts'].append(c)
         if c['is_primary']:
             permissions['primary_contact'] = c
@@ -260,32 +464,78 @@ def limsfm_get_project_permissions(uuid):
     return permissions
 
 
-def limsfm_get_project(uuid):
-    """Return a Project dictionary, including ProjectLines, from LIMSfm"""
+@request_memoized
+def limsfm_get_project_permissions(uuid):
+    """
+    Return a project permissions dictionary (lightweight, single api call,
+    or none when the project is in the shared cache).
+    Can be merged with a full project dictionary via dict.update()
+    """
+    cached, generation = limsfm_cache_get(limsfm_project_cache_key(uuid))
+    if cached is not None:
+        records = cached['contacts']
+    else:
+        records = _limsfm_get_project_contact_records(uuid)
+    return permissions_from_limsfm(uuid, records)
 
-    # Get project
-    uri = ('layout/project_api/%(field)s%(value)s' %
-           {
-               'field': urlquote('uuid==='),
-               'value': urlquote(uuid)
-           })
-    project_response = limsfm_request(uri, 'get')
-    project = project_from_limsfm(project_response.json()['data'][0])
 
-    # Get project permissions
-    project.update(limsfm_get_project_permissions(uuid))
+def _limsfm_get_project_records(uuid):
+    """Return the raw project, project contact and projectline records.
 
-    # Get project lines
-    lines_response = limsfm_request('layout/projectline_api', 'get', {
-        'RFMsF1': 'project_id',
-        'RFMsV1': project['project_id'],
+    With RESTFM_CONCURRENT_FETCH the contact and projectline searches run
+    on the worker's LIMSfm thread pool alongside the project lookup, so the
+    call costs roughly the slowest of the three round trips.
+    """
+    project_uri = ('layout/project_api/%(field)s%(value)s' %
+                   {
+                       'field': urlquote('uuid==='),
+                       'value': urlquote(uuid)
+                   })
+    lines_params = {
+        'RFMsF1': 'Project::uuid',
+        'RFMsV1': uuid,
         'RFMmax': 0
-    })
-    projectlines_raw = lines_response.json()['data']
+    }
+
+    if getattr(settings, 'RESTFM_CONCURRENT_FETCH', True):
+        executor = get_limsfm_executor()
+        contacts_future = submit_with_request_memo(
+            executor, _limsfm_get_project_contact_records, uuid)
+        lines_future = executor.submit(
+            limsfm_request, 'layout/projectline_api', 'get', lines_params)
+        project_response = limsfm_request(project_uri, 'get')
+        contact_records = contacts_future.result()
+        lines_response = lines_future.result()
+    else:
+        project_response = limsfm_request(project_uri, 'get')
+        contact_records = _limsfm_get_project_contact_records(uuid)
+        lines_response = limsfm_request(
+            'layout/projectline_api', 'get', lines_params)
+
+    return {
+        'project': project_response.json()['data'][0],
+        'contacts': contact_records,
+        'projectlines': lines_response.json()['data'],
+    }
+
+
+@request_memoized
+def limsfm_get_project(uuid, use_cache=True):
+    """Return a Project dictionary, including ProjectLines, from LIMSfm
+       (or the shared cache, see LIMSFM_CACHE_TIMEOUT, unless use_cache is
+       False; a fresh read still refills the cache)"""
+    key = limsfm_project_cache_key(uuid)
+    records, generation = limsfm_cache_get(key)
+    if records is None or not use_cache:
+        records = _limsfm_get_project_records(uuid)
+        limsfm_cache_set(key, records, generation)
+
+    project = project_from_limsfm(records['project'])
+    project.update(permissions_from_limsfm(uuid, records['contacts']))
 
     # Map filemaker projectline keys to django keys
     projectlines = []
-    for pl in projectlines_raw:
+    for pl in records['projectlines']:
         projectline = projectline_from_limsfm(pl)
         projectlines.append(projectline)
 
@@ -307,6 +557,33 @@ def limsfm_get_project(uuid):
     return project
 
 
+def limsfm_project_cache_keys(uuid, contacts=None):
+    """Return the shared cache keys a write to project `uuid` invalidates:
+       the project itself and each of its contacts' project lists. Pass
+       the project's `contacts` when the caller already has them; otherwise
+       they come from limsfm_get_project_permissions(), which the view's
+       permission check has already read for this request"""
+    if contacts is None:
+        contacts = limsfm_get_project_permissions(uuid)['contacts']
+    keys = [limsfm_project_cache_key(uuid)]
+    for c in contacts:
+        keys.append(limsfm_contact_cache_key(c['email']))
+    return keys
+
+
+def limsfm_cache_evict(keys):
+    """Evict keys after a write, bumping their generations so that reads
+       which started before the write cannot cache what they fetched"""
+    for key in keys:
+        generation_key = limsfm_cache_generation_key(key)
+        try:
+            cache.incr(generation_key)
+        except ValueError:
+            cache.set(generation_key, 1, None)
+    cache.delete_many(keys)
+    clear_request_memo()
+
+
 def limsfm_update_project(uuid, cleaned_data):
     """Update a project record"""
 
@@ -322,7 +599,10 @@ def limsfm_update_project(uuid, cleaned_data):
                'field': urlquote('uuid==='),
                'value': urlquote(uuid)
            })
-    return limsfm_request(uri, 'put', json=json)
+    keys = limsfm_project_cache_keys(uuid)
+    response = limsfm_request(uri, 'put', json=json)
+    limsfm_cache_evict(keys)
+    return response
 
 
 def limsfm_update_projectline(project_uuid, projectline_uuid, cleaned_data):
@@ -334,19 +614,112 @@ def limsfm_update_projectline(project_uuid, projectline_uuid, cleaned_data):
                'field': urlquote('uuid==='),
                'value': urlquote(projectline_uuid)
            })
+    keys = limsfm_project_cache_keys(project_uuid)
     update_response = limsfm_request(uri, 'put', json=json)
+    limsfm_cache_evict(keys)
     return update_response
 
 
-def limsfm_bulk_update_projectlines(project_uuid, projectlines):
-    """Update LIMSfm ProjectLines in bulk"""
-
+def _bulk_chunk_results(uuids, response):
+    """Return per-record results for a RESTfm bulk response. Records that
+       failed are listed in its 'multistatus' section (HTTP 207)"""
+    results = [{'uuid': uuid, 'ok': True, 'status': response.status_code,
+                'reason': ''} for uuid in uuids]
+    for status in response.json().get('multistatus', []):
+        result = results[int(status['index'])]
+        result['status'] = int(status.get('Status', 500))
+        result['ok'] = 200 <= result['status'] < 300
+        result['reason'] = status.get('Reason', '')
+    return results
+
+
+def _request_error_reason(e):
+    """Return the reason given for a failed LIMSfm request: RESTfm's
+       X-RESTfm-Reason, the response body, or the HTTP status"""
+    response = e.response
+    if response is None:
+        return str(e)
+    reason = response.headers.get('X-RESTfm-Reason')
+    if not reason:
+        try:
+            reason = response.json()['info']['X-RESTfm-Reason']
+        except (ValueError, KeyError, TypeError):
+            reason = response.text.strip()[:200]
+    return reason or 'HTTP %s' % response.status_code
+
+
+def _bulk_update_chunk(project_uuid, chunk, retries, backoff):
+    """PUT one chunk of projectline updates, retrying failed requests with
+       exponential backoff; return per-record results.
+
+    A chunk whose records LIMSfm rejects (BULK_SPLIT_STATUSES) is split in
+    half and each half sent again, so the records it accepts are still
+    saved and only the records it rejects are reported, with its reason.
+    Other client errors, such as 401 and 403, fail the whole chunk at once.
+    """
     json = {'meta': [], 'data': []}
-    for k, v in projectlines.items():
+    for k, v in chunk:
         json['meta'].append({'recordID': ('uuid===%s' % k)})
-        json['data'].append(projectline_to_fm_dict(project_uuid, v))
-    update_response = limsfm_request('bulk/projectline_api', 'put', json=json)
-    return update_response
+        json['data'].append(projectline_to_fm_dict(project_uuid, dict(v)))
+    uuids = [k for k, v in chunk]
+
+    for attempt in range(retries + 1):
+        try:
+            response = limsfm_request('bulk/projectline_api', 'put', json=json)
+        except requests.RequestException as e:
+            status = getattr(e.response, 'status_code', None)
+            if status in BULK_SPLIT_STATUSES and len(chunk) > 1:
+                half = len(chunk) // 2
+                return (_bulk_update_chunk(project_uuid, chunk[:half],
+                                           retries, backoff) +
+                        _bulk_update_chunk(project_uuid, chunk[half:],
+                                           retries, backoff))
+            retryable = (status is None or status >= 500 or
+                         status in BULK_RETRY_STATUSES)
+            if not retryable or attempt == retries:
+                reason = _request_error_reason(e)
+                return [{'uuid': uuid, 'ok': False, 'status': status,
+                         'reason': reason} for uuid in uuids]
+            time.sleep(backoff * 2 ** attempt)
+        else:
+            return _bulk_chunk_results(uuids, response)
+
+
+def limsfm_bulk_update_projectlines(project_uuid, projectlines,
+                                    chunk_size=None, parallel=None,
+                                    contacts=None):
+    """Update LIMSfm ProjectLines in bulk, {uuid: cleaned_data}.
+
+    Updates are sent in chunks of RESTFM_BULK_CHUNK_SIZE records (in parallel
+    on the LIMSfm thread pool with RESTFM_BULK_PARALLEL); failed chunks are
+    retried, and chunks LIMSfm rejects are split. Returns a list of
+    {'uuid', 'ok', 'status', 'reason'} results, one per projectline, so
+    callers can report partial success. `contacts` is passed to
+    limsfm_project_cache_keys().
+    """
+    if chunk_size is None:
+        chunk_size = getattr(settings, 'RESTFM_BULK_CHUNK_SIZE', 50)
+    if parallel is None:
+        parallel = getattr(settings, 'RESTFM_BULK_PARALLEL', False)
+    retries = getattr(settings, 'RESTFM_BULK_RETRIES', 2)
+    backoff = getattr(settings, 'RESTFM_BULK_BACKOFF', 1.0)
+
+    items = list(projectlines.items())
+    chunks = [items[i:i + chunk_size]
+              for i in range(0, len(items), chunk_size)]
+
+    keys = limsfm_project_cache_keys(project_uuid, contacts)
+    if parallel:
+        executor = get_limsfm_executor()
+        futures = [executor.submit(_bulk_update_chunk, project_uuid, chunk,
+                                   retries, backoff) for chunk in chunks]
+        chunk_results = [f.result() for f in futures]
+    else:
+        chunk_results = [_bulk_update_chunk(project_uuid, chunk, retries,
+                                            backoff) for chunk in chunks]
+    limsfm_cache_evict(keys)
+
+    return [result for results in chunk_results for result in results]
 
 
 def limsfm_get_taxonomy(data_set=None, q=None):
@@ -396,14 +769,21 @@ def limsfm_project_add_contact(project_uuid, cleaned_data):
     """Call a script to crate a new ProjecContact record"""
     uri = 'script/project_add_contact/project_contact_api'
     cleaned_data['project_uuid'] = project_uuid
-    return limsfm_request(uri, 'get', params={'RFMscriptParam': json.dumps(cleaned_data)})
+    keys = limsfm_project_cache_keys(project_uuid)
+    keys.append(limsfm_contact_cache_key(cleaned_data['email']))
+    response = limsfm_request(uri, 'get', params={'RFMscriptParam': json.dumps(cleaned_data)})
+    limsfm_cache_evict(keys)
+    return response
 
 
 def limsfm_project_remove_contact(project_uuid, contact_uuid):
     """Call a script to delete a ProjecContact record"""
     uri = 'script/project_remove_contact/REST'
     param = {'project_uuid': project_uuid, 'contact_uuid': contact_uuid}
-    return limsfm_request(uri, 'get', params={'RFMscriptParam': json.dumps(param)})
+    keys = limsfm_project_cache_keys(project_uuid)
+    response = limsfm_request(uri, 'get', params={'RFMscriptParam': json.dumps(param)})
+    limsfm_cache_evict(keys)
+    return response
 
 
 def limsfm_create_quote(form_data):
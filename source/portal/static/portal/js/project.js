@@ -43,7 +43,8 @@
   portal.envSampleTypes = new Bloodhound({
     datumTokenizer: Bloodhound.tokenizers.whitespace,
     queryTokenizer: Bloodhound.tokenizers.whitespace,
-    prefetch: '/portal/environmentalsampletype/typeahead/'
+    prefetch: mngweb.typeahead.prefetchUrl(
+      'environmental_sample_types', '/portal/environmentalsampletype/typeahead/')
   });
   portal.envSampleTypesWithDefaults = function (q, sync) {
     if (q === '') {
@@ -52,16 +53,6 @@
       portal.envSampleTypes.search(q, sync);
     }
   };
-  $('.environmentalsampletype-typeahead input').typeahead({
-    hint: true,
-    highlight: true,
-    minLength: 0
-  },
-  {
-    name: 'envSampleTypes',
-    limit: Infinity,
-    source: portal.envSampleTypesWithDefaults,
-  });
 
   /*
   'Host sample type' typeahead
@@ -69,7 +60,8 @@
   portal.hostSampleTypes = new Bloodhound({
     datumTokenizer: Bloodhound.tokenizers.whitespace,
     queryTokenizer: Bloodhound.tokenizers.whitespace,
-    prefetch: '/portal/hostsampletype/typeahead/'
+    prefetch: mngweb.typeahead.prefetchUrl(
+      'host_sample_types', '/portal/hostsampletype/typeahead/')
   });
   portal.hostSampleTypesWithDefaults = function (q, sync) {
     if (q === '') {
@@ -78,15 +70,84 @@
       portal.hostSampleTypes.search(q, sync);
     }
   };
-  $('.hostsampletype-typeahead input').typeahead({
-    hint: true,
-    highlight: true,
-    minLength: 0
-  },
-  {
-    name: 'hostSampleTypes',
-    limit: Infinity,
-    source: portal.hostSampleTypesWithDefaults,
+
+  /*
+  Projectline edit forms: typeaheads and meta data fields
+  */
+  portal.initProjectlineForms = function (context) {
+    context = $(context);
+    context.find('.environmentalsampletype-typeahead input').typeahead({
+      hint: true,
+      highlight: true,
+      minLength: 0
+    },
+    {
+      name: 'envSampleTypes',
+      limit: Infinity,
+      source: portal.envSampleTypesWithDefaults,
+    });
+    context.find('.hostsampletype-typeahead input').typeahead({
+      hint: true,
+      highlight: true,
+      minLength: 0
+    },
+    {
+      name: 'hostSampleTypes',
+      limit: Infinity,
+      source: portal.hostSampleTypesWithDefaults,
+    });
+    mngweb.typeahead.initCountryTypeaheads(context);
+    mngweb.typeahead.initEbiTaxonomyTypeaheads(context);
+    context.find('select[name="study_type"]').each(function() {
+      portal.showMetaFields($(this).parent().parent());
+    });
+  };
+
+  /*
+  Projectline editor, loaded from the server a page (plate) at a time
+  */
+  portal.editorPages = {};
+
+  function loadProjectlineEditor(button, callback) {
+    var plate = button.data('plate'),
+        page = button.data('page'),
+        key = plate + '/' + page;
+    if (portal.editorPages[key]) {
+      callback();
+      return;
+    }
+    button.prop('disabled', true);
+    $.ajax({
+      url: $('#projectline-summary').data('editor-url'),
+      type: 'GET',
+      data: {plate: plate, page: page},
+      dataType: 'json',
+
+      success: function(json) {
+        var rows = $($.parseHTML(json.html)).filter('tr');
+        rows.each(function() {
+          $('#pl-row-' + $(this).data('projectline')).after(this);
+        });
+        portal.initProjectlineForms(rows);
+        portal.editorPages[key] = true;
+        callback();
+      },
+
+      error: function(xhr,errmsg,err) {
+        console.log(xhr.status + ': ' + xhr.responseText);
+      },
+
+      complete: function() {
+        button.prop('disabled', false);
+      },
+    });
+  }
+
+  $(document).on('click', 'button.pl-edit-button', function() {
+    var button = $(this);
+    loadProjectlineEditor(button, function() {
+      $(button.data('target')).collapse('toggle');
+    });
   });
 
   /*
@@ -103,8 +164,8 @@
       }
     });
   }
-  $(document).on('typeahead:change', 'input[name="taxon_id"]', function (event) { ebiTaxonomyOnChange(event, $('input[name="taxon_name"]')); });
-  $(document).on('typeahead:change', 'input[name="host_taxon_id"]', function (event) { ebiTaxonomyOnChange(event, $('input[name="host_taxon_name"]')); });
+  $(document).on('typeahead:change', 'input[name="taxon_id"]', function (event) { ebiTaxonomyOnChange(event, $(event.target).closest('form').find('input[name="taxon_name"]')); });
+  $(document).on('typeahead:change', 'input[name="host_taxon_id"]', function (event) { ebiTaxonomyOnChange(event, $(event.target).closest('form').find('input[name="host_taxon_name"]')); });
   $(document).on('typeahead:select', 'input[name="taxon_id"], input[name="host_taxon_id"]', function (event, selection) { $(event.target).trigger('typeahead:change', [selection]).blur(); });
 
   /*
@@ -139,8 +200,55 @@
   /*
   AJAX sample sheet upload
   */
+  function showSampleSheetErrors(messages) {
+    var i;
+    $('#upload_progress_modal').modal('hide');
+    $('#sample_sheet_error_list').html('');
+    for (i = 0; i < messages.length; i++) {
+      $('#sample_sheet_error_list').append($('<li>').text(messages[i]));
+    }
+    $('#sample_sheet_errors_modal').modal('show');
+  }
+
+  function pollSampleSheetUpload(statusUrl) {
+    $.ajax({
+      url: statusUrl,
+      type: 'GET',
+      cache: false,
+      dataType: 'json',
+
+      success: function(json) {
+        if (json.rows_total) {
+          $('#upload_progress_text').text(
+            'Validated ' + json.rows_validated + ' of ' + json.rows_total + ' rows.');
+        }
+        if (json.status === 'done') {
+          $('#sample_sheet_success_text').text(json.message);
+          $('#upload_progress_modal').modal('hide');
+          $('#sample_sheet_success_modal').modal('show');
+          setTimeout(function () {
+            window.location.href = json.redirect_url;
+          }, 500);
+        } else if (json.status === 'failed') {
+          // Rows may have been partially saved before a LIMS failure
+          $('#sample_sheet_saved_text').text(json.rows_updated ? json.message : '');
+          $('#sample_sheet_nothing_saved_text').toggle(!json.rows_updated);
+          showSampleSheetErrors(json.errors);
+        } else {
+          setTimeout(function () { pollSampleSheetUpload(statusUrl); }, 1000);
+        }
+      },
+
+      error: function(xhr,errmsg,err) {
+        console.log(xhr.status + ': ' + xhr.responseText);
+        setTimeout(function () { pollSampleSheetUpload(statusUrl); }, 3000);
+      },
+    });
+  }
+
   $('#sample_sheet_form').on('submit', function(event){
     event.preventDefault();
+    $('#upload_progress_text').text('');
     $('#upload_progress_modal').modal('show');
 
     var formData = new FormData();
@@ -159,29 +267,24 @@
       contentType: false, // Set content type to false as jQuery will tell the server its a query string request
 
       success: function(json) {
-        $('#upload_progress_modal').modal('hide');
-        $('#sample_sheet_success_modal').modal('show');
-        setTimeout(function () {
-          window.location.href = json.redirect_url;
-        }, 500);
+        // Upload queued; poll until the worker has processed it
+        pollSampleSheetUpload(json.status_url);
       },
 
       error: function(xhr,errmsg,err) {
         var json = JSON.parse(xhr.responseText);
-        var messages, i, m;
+        var messages = [], i;
 
         console.log(xhr.status + ': ' + xhr.responseText); // provide a bit more info about the error to the console
 
-        $('#upload_progress_modal').modal('hide');
+        $('#sample_sheet_saved_text').text('');
+        $('#sample_sheet_nothing_saved_text').show();
         if ('messages' in json) {
-          $('#sample_sheet_error_list').html('');
-          messages = json.messages;
-          for (i = 0; i < messages.length; i++) {
-            m = messages[i];
-            $('#sample_sheet_error_list').append('<li>' + m.message + '</li>');
+          for (i = 0; i < json.messages.length; i++) {
+            messages.push(json.messages[i].message);
           }
         }
-        $('#sample_sheet_errors_modal').modal('show');
+        showSampleSheetErrors(messages);
       },
     });
   });
@@ -191,12 +294,7 @@
   */
   $(document).ready(function () {
     // Study type meta-data fields
-    $('select[name="study_type"]').each(function() {
-      var context = $(this).parent().parent();
-      portal.showMetaFields(context);
-    });
-
-    $('select[name="study_type"]').change(function() {
+    $(document).on('change', 'select[name="study_type"]', function() {
       var context = $(this).parent().parent();
       portal.clearMetaFields(context);
       portal.showMetaFields(context);
@@ -0,0 +1,579 @@
+import io
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import requests
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from openpyxl import load_workbook
+
+from taxon.models import NcbiTaxon
+from . import ebi_services, jobs, memo, sample_sheet, services
+from .models import SampleSheetUpload
+
+
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'portal-tests',
+    }
+}
+
+
+class RequestMemoTest(SimpleTestCase):
+
+    def setUp(self):
+        self.calls = []
+
+        @memo.request_memoized
+        def fetch(*args, **kwargs):
+            self.calls.append((args, kwargs))
+            return len(self.calls)
+        self.fetch = fetch
+
+    def tearDown(self):
+        memo.end_request_memo()
+
+    def test_not_memoised_outside_a_request(self):
+        self.assertEqual([self.fetch('a'), self.fetch('a')], [1, 2])
+
+    def test_memoised_within_a_request(self):
+        memo.begin_request_memo()
+        self.assertEqual([self.fetch('a'), self.fetch('a'), self.fetch('b'),
+                          self.fetch('a', use_cache=False)], [1, 1, 2, 3])
+
+    def test_each_request_starts_afresh(self):
+        memo.begin_request_memo()
+        self.fetch('a')
+        memo.end_request_memo()
+        memo.begin_request_memo()
+        self.assertEqual(self.fetch('a'), 2)
+
+    def test_cleared_after_writes(self):
+        memo.begin_request_memo()
+        self.fetch('a')
+        memo.clear_request_memo()
+        self.assertEqual(self.fetch('a'), 2)
+
+    def test_pool_threads_share_the_request_memo(self):
+        memo.begin_request_memo(bypass_cache=True)
+        self.fetch('a')
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            result = memo.submit_with_request_memo(
+                executor, lambda: (self.fetch('a'),
+                                   memo.request_bypasses_cache())).result()
+            # The pool thread does not keep the request's memo
+            stray = executor.submit(memo.get_request_memo).result()
+        self.assertEqual(result, (1, True))
+        self.assertIsNone(stray)
+
+    def test_threads_outside_the_request_are_not_memoised(self):
+        memo.begin_request_memo()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            executor.submit(self.fetch, 'a').result()
+            executor.submit(self.fetch, 'a').result()
+        self.assertEqual(len(self.calls), 2)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class LimsfmCacheTest(SimpleTestCase):
+
+    key = services.limsfm_project_cache_key('project-uuid')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_fill_and_read(self):
+        value, generation = services.limsfm_cache_get(self.key)
+        self.assertIsNone(value)
+        services.limsfm_cache_set(self.key, {'project': 1}, generation)
+        self.assertEqual(services.limsfm_cache_get(self.key)[0],
+                         {'project': 1})
+
+    def test_evict(self):
+        value, generation = services.limsfm_cache_get(self.key)
+        services.limsfm_cache_set(self.key, {'project': 1}, generation)
+        services.limsfm_cache_evict([self.key])
+        self.assertIsNone(services.limsfm_cache_get(self.key)[0])
+
+    def test_fill_started_before_write_is_dropped(self):
+        value, generation = services.limsfm_cache_get(self.key)
+        services.limsfm_cache_evict([self.key])  # a write lands mid-read
+        services.limsfm_cache_set(self.key, {'project': 'stale'}, generation)
+        self.assertIsNone(services.limsfm_cache_get(self.key)[0])
+
+    def test_entry_of_older_generation_is_ignored(self):
+        value, generation = services.limsfm_cache_get(self.key)
+        services.limsfm_cache_evict([self.key])
+        # A fill that raced past limsfm_cache_set's generation check
+        cache.set(self.key, (generation, {'project': 'stale'}))
+        self.assertIsNone(services.limsfm_cache_get(self.key)[0])
+
+    def test_bypass(self):
+        value, generation = services.limsfm_cache_get(self.key)
+        services.limsfm_cache_set(self.key, {'project': 1}, generation)
+        with mock.patch.object(services, 'request_bypasses_cache',
+                               return_value=True):
+            self.assertIsNone(services.limsfm_cache_get(self.key)[0])
+
+    @mock.patch.object(services, 'permissions_from_limsfm', return_value={})
+    @mock.patch.object(services, 'project_from_limsfm',
+                       side_effect=lambda record: dict(record))
+    def test_get_project_without_cache(self, *mocks):
+        value, generation = services.limsfm_cache_get(self.key)
+        services.limsfm_cache_set(self.key, {
+            'project': {'name': 'stale', 'results_path': '',
+                        'data_sent_date': None},
+            'contacts': [], 'projectlines': []}, generation)
+        fresh = {'project': {'name': 'fresh', 'results_path': '',
+                             'data_sent_date': None},
+                 'contacts': [], 'projectlines': []}
+        with mock.patch.object(services, '_limsfm_get_project_records',
+                               return_value=fresh):
+            self.assertEqual(
+                services.limsfm_get_project('project-uuid')['name'], 'stale')
+            self.assertEqual(services.limsfm_get_project(
+                'project-uuid', use_cache=False)['name'], 'fresh')
+        # The fresh read refills the cache
+        self.assertEqual(services.limsfm_cache_get(self.key)[0], fresh)
+
+    def _contact_record(self, email):
+        return {'Project::portal_login_required': '0',
+                'Contact::uuid': 'contact-uuid', 'Contact::email_address': email,
+                'unstored_is_primary': '1', 'Contact::name_full': 'A'}
+
+    def test_project_cache_keys_use_cached_contacts(self):
+        value, generation = services.limsfm_cache_get(self.key)
+        services.limsfm_cache_set(self.key, {'contacts': [
+            self._contact_record('A@example.com')]}, generation)
+        with mock.patch.object(
+                services, '_limsfm_get_project_contact_records') as fetch:
+            keys = services.limsfm_project_cache_keys('project-uuid')
+        fetch.assert_not_called()
+        self.assertEqual(keys, [
+            self.key, services.limsfm_contact_cache_key('a@example.com')])
+
+    def test_project_cache_keys_ignore_stale_generation(self):
+        value, generation = services.limsfm_cache_get(self.key)
+        services.limsfm_cache_evict([self.key])
+        cache.set(self.key, (generation, {'contacts': [
+            self._contact_record('old@example.com')]}))
+        with mock.patch.object(
+                services, '_limsfm_get_project_contact_records',
+                return_value=[self._contact_record('new@example.com')]):
+            keys = services.limsfm_project_cache_keys('project-uuid')
+        self.assertEqual(keys, [
+            self.key, services.limsfm_contact_cache_key('new@example.com')])
+
+    def test_project_cache_keys_with_contacts(self):
+        with mock.patch.object(
+                services, 'limsfm_get_project_permissions') as permissions:
+            keys = services.limsfm_project_cache_keys(
+                'project-uuid', [{'email': 'A@example.com'}])
+        permissions.assert_not_called()
+        self.assertEqual(keys, [
+            self.key, services.limsfm_contact_cache_key('a@example.com')])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class UploadQueueTest(TestCase):
+
+    def enqueue(self, name='sheet.csv', content=b''):
+        return jobs.enqueue_sample_sheet_upload(
+            'project-uuid', SimpleUploadedFile(name, content))
+
+    def test_claims_oldest_queued_upload_once(self):
+        first, second = self.enqueue('first.csv'), self.enqueue('second.csv')
+        claimed = jobs.claim_next_upload()
+        self.assertEqual(claimed.pk, first.pk)
+        self.assertEqual(claimed.status, SampleSheetUpload.STATUS_RUNNING)
+        self.assertEqual(jobs.claim_next_upload().pk, second.pk)
+        self.assertIsNone(jobs.claim_next_upload())
+
+    def test_claim_loses_race_to_another_worker(self):
+        upload = self.enqueue()
+        # Another worker claims the upload between the lookup and update
+        real_filter = SampleSheetUpload.objects.filter
+
+        def filter(*args, **kwargs):
+            if 'pk' in kwargs:
+                (SampleSheetUpload.objects.all()
+                 .update(status=SampleSheetUpload.STATUS_RUNNING))
+            return real_filter(*args, **kwargs)
+        with mock.patch.object(SampleSheetUpload.objects, 'filter', filter):
+            self.assertIsNone(jobs.claim_next_upload())
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, SampleSheetUpload.STATUS_RUNNING)
+
+    def test_requeue_interrupted_uploads(self):
+        self.enqueue()
+        jobs.claim_next_upload()
+        done = self.enqueue()
+        done.status = SampleSheetUpload.STATUS_DONE
+        done.save()
+        self.assertEqual(jobs.requeue_interrupted_uploads(), 1)
+        self.assertEqual(jobs.claim_next_upload().status,
+                         SampleSheetUpload.STATUS_RUNNING)
+        done.refresh_from_db()
+        self.assertEqual(done.status, SampleSheetUpload.STATUS_DONE)
+
+    def test_unreadable_upload_fails_with_status(self):
+        upload = self.enqueue('sheet.csv', b'not\na\nsample sheet\n')
+        jobs.process_upload(jobs.claim_next_upload())
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, SampleSheetUpload.STATUS_FAILED)
+        self.assertEqual(bytes(upload.file_content), b'')
+        status = jobs.upload_status_to_json(upload)
+        self.assertEqual(status['error_count'], 1)
+        self.assertEqual(status['errors'], [jobs.INVALID_HEADERS_MESSAGE])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ProcessUploadTest(TestCase):
+
+    def setUp(self):
+        self.upload = SampleSheetUpload.objects.create(
+            project_uuid='project-uuid', file_name='sheet.csv',
+            file_content=b'', status=SampleSheetUpload.STATUS_RUNNING)
+
+    @mock.patch.object(jobs, 'read_sample_sheet', return_value=iter([]))
+    @mock.patch.object(jobs, 'parse_sample_sheet', return_value={
+        'errors': [{'row': 6, 'message': 'Invalid'}], 'updates': {},
+        'rows': {}, 'unchanged': 0})
+    @mock.patch.object(jobs, 'limsfm_get_project')
+    def test_diffs_against_uncached_project(self, limsfm_get_project, *mocks):
+        jobs.process_upload(self.upload)
+        limsfm_get_project.assert_called_once_with('project-uuid',
+                                                   use_cache=False)
+        self.assertEqual(self.upload.status, SampleSheetUpload.STATUS_FAILED)
+
+
+def _http_error(status, reason=''):
+    response = requests.Response()
+    response.status_code = status
+    response.headers['X-RESTfm-Reason'] = reason
+    return requests.HTTPError(response=response)
+
+
+def _bulk_response(multistatus=()):
+    response = mock.Mock(status_code=200)
+    response.json.return_value = {'multistatus': list(multistatus)}
+    return response
+
+
+@mock.patch.object(services, 'limsfm_cache_evict')
+@mock.patch.object(services, 'limsfm_project_cache_keys', return_value=[])
+@mock.patch.object(services, 'projectline_to_fm_dict',
+                   side_effect=lambda project_uuid, data: data)
+@override_settings(CACHES=TEST_CACHES)
+@mock.patch('time.sleep')
+class BulkUpdateProjectlinesTest(SimpleTestCase):
+
+    projectlines = {'pl%d' % i: {'value': i} for i in range(4)}
+
+    def update(self, request):
+        with mock.patch.object(services, 'limsfm_request',
+                               side_effect=request) as limsfm_request:
+            results = services.limsfm_bulk_update_projectlines(
+                'project-uuid', self.projectlines, chunk_size=4,
+                parallel=False)
+        return limsfm_request, {r['uuid']: r for r in results}
+
+    def test_per_record_results(self, *mocks):
+        limsfm_request, results = self.update(lambda *a, **kw: _bulk_response(
+            [{'index': 2, 'Status': 409, 'Reason': 'Record locked'}]))
+        self.assertEqual(limsfm_request.call_count, 1)
+        self.assertEqual(
+            [uuid for uuid, r in sorted(results.items()) if r['ok']],
+            ['pl0', 'pl1', 'pl3'])
+        self.assertEqual(results['pl2']['reason'], 'Record locked')
+
+    def test_server_errors_are_retried(self, *mocks):
+        responses = [_http_error(503), _bulk_response()]
+
+        def request(*args, **kwargs):
+            response = responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+        limsfm_request, results = self.update(request)
+        self.assertEqual(limsfm_request.call_count, 2)
+        self.assertTrue(all(r['ok'] for r in results.values()))
+
+    def test_retries_give_up_with_reason(self, *mocks):
+        limsfm_request, results = self.update(
+            mock.Mock(side_effect=_http_error(503, 'Unavailable')))
+        self.assertEqual(limsfm_request.call_count, 3)
+        self.assertEqual({r['reason'] for r in results.values()},
+                         {'Unavailable'})
+
+    def test_rejected_chunk_is_split_to_save_good_records(self, *mocks):
+        def request(uri, method, json):
+            ids = [meta['recordID'] for meta in json['meta']]
+            if 'uuid===pl1' in ids:
+                raise _http_error(400, 'Invalid value')
+            return _bulk_response()
+        limsfm_request, results = self.update(request)
+        self.assertEqual(
+            [uuid for uuid, r in sorted(results.items()) if r['ok']],
+            ['pl0', 'pl2', 'pl3'])
+        self.assertEqual(results['pl1']['status'], 400)
+        self.assertEqual(results['pl1']['reason'], 'Invalid value')
+        # The whole chunk, then its halves, then the failing half's records
+        self.assertEqual(limsfm_request.call_count, 5)
+
+    def test_auth_failure_fails_whole_chunk_at_once(self, *mocks):
+        limsfm_request, results = self.update(
+            mock.Mock(side_effect=_http_error(403, 'Forbidden')))
+        self.assertEqual(limsfm_request.call_count, 1)
+        self.assertEqual({r['status'] for r in results.values()}, {403})
+        self.assertFalse(any(r['ok'] for r in results.values()))
+
+    def test_rate_limited_chunk_is_retried(self, *mocks):
+        responses = [_http_error(429), _bulk_response()]
+
+        def request(*args, **kwargs):
+            response = responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+        limsfm_request, results = self.update(request)
+        self.assertEqual(limsfm_request.call_count, 2)
+        self.assertTrue(all(r['ok'] for r in results.values()))
+
+    def test_reason_falls_back_to_status(self, *mocks):
+        limsfm_request, results = self.update(
+            mock.Mock(side_effect=_http_error(404)))
+        self.assertEqual({r['reason'] for r in results.values()},
+                         {'HTTP 404'})
+
+
+@override_settings(CACHES=TEST_CACHES)
+class EbiTaxonomyByIdsTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        NcbiTaxon.objects.create(taxid=562, name='Escherichia coli')
+
+    def test_local_ids_are_normalised(self):
+        with mock.patch.object(ebi_services, 'ebi_get_taxonomy_by_ids') as get:
+            taxa = ebi_services.ebi_search_taxonomy_by_ids(
+                ['562', '0562', ' 562', 'abc'])
+        get.assert_not_called()
+        for taxid in ['562', '0562', ' 562']:
+            self.assertEqual(taxa[taxid][0]['fields']['name'],
+                             ['Escherichia coli'])
+        self.assertIsNone(taxa['abc'])
+
+    def test_ebi_batches_match_normalised_ids(self):
+        entry = {'id': '1280', 'fields': {'name': ['Staphylococcus aureus']}}
+        with mock.patch.object(ebi_services, 'ebi_get_taxonomy_by_ids',
+                               return_value={'1280': [entry]}) as get:
+            taxa = ebi_services.ebi_search_taxonomy_by_ids(['01280', '99'])
+        self.assertEqual(get.call_count, 1)
+        self.assertEqual(sorted(get.call_args[0][0]), ['1280', '99'])
+        self.assertEqual(taxa['01280'], [entry])
+        self.assertIsNone(taxa['99'])
+        # Found entries are cached for single lookups
+        self.assertEqual(ebi_services.ebi_search_taxonomy_by_id('1280'),
+                         [entry])
+
+    def test_unreachable_or_invalid_ebi_leaves_ids_out(self):
+        for error in [requests.Timeout(), ValueError('not JSON')]:
+            with mock.patch.object(ebi_services, 'ebi_get_taxonomy_by_ids',
+                                   side_effect=error):
+                taxa = ebi_services.ebi_search_taxonomy_by_ids(['1280'])
+            self.assertEqual(taxa, {})
+
+    def test_ebi_requests_time_out(self):
+        with mock.patch('requests.get') as get:
+            get.return_value.json.return_value = {'entries': []}
+            ebi_services.ebi_get_taxonomy_by_ids(['1280'])
+        self.assertEqual(get.call_args[1]['timeout'],
+                         ebi_services.EBI_TAXONOMY_TIMEOUT)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class EbiTypeaheadSearchTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        ebi_services._typeahead_cache.clear()
+        NcbiTaxon.objects.create(taxid=562, name='Escherichia coli')
+
+    def test_searches_are_cached_under_normalised_params(self):
+        result = {'hitCount': 1, 'entries': []}
+        with mock.patch.object(ebi_services, 'ebi_get_typeahead',
+                               return_value=result) as get:
+            for query in ['Esch', ' Esch ']:
+                self.assertEqual(ebi_services.ebi_typeahead_search(
+                    {'query': query, 'size': '500'}), result)
+            # A new process still finds the search in the shared cache
+            ebi_services._typeahead_cache.clear()
+            ebi_services.ebi_typeahead_search({'query': 'Esch', 'size': '100'})
+        get.assert_called_once_with([
+            ('format', 'json'), ('query', 'Esch'),
+            ('size', ebi_services.EBI_BATCH_SIZE)])
+
+    def test_taxids_are_looked_up_locally(self):
+        with mock.patch.object(ebi_services, 'ebi_get_typeahead') as get:
+            result = ebi_services.ebi_typeahead_search({'q': '562'})
+        get.assert_not_called()
+        self.assertEqual(result['entries'][0]['fields']['name'],
+                         ['Escherichia coli'])
+
+    def test_no_query(self):
+        with mock.patch.object(ebi_services, 'ebi_get_typeahead') as get:
+            self.assertEqual(ebi_services.ebi_typeahead_search({}),
+                             {'hitCount': 0, 'entries': []})
+        get.assert_not_called()
+
+
+def _projectline(sample_ref, customers_ref=''):
+    return {'sample_ref': sample_ref, 'customers_ref': customers_ref,
+            'dna_concentration_ng_ul': '', 'volume_ul': '', 'taxon_id': '',
+            'collection_day': '', 'collection_month': '',
+            'collection_year': '', 'geo_country_name': '',
+            'geo_specific_location': '', 'study_type': 'Lab',
+            'lab_experiment_type': '', 'further_details': ''}
+
+
+TEMPLATE_BASE_PATH = os.path.join(
+    os.path.dirname(sample_sheet.__file__),
+    'static/portal/excel/mng_excel_template_base.xlsx')
+
+
+@mock.patch.object(sample_sheet, 'SAMPLE_SHEET_TEMPLATE_PATH',
+                   TEMPLATE_BASE_PATH)
+@override_settings(CACHES=TEST_CACHES)
+class WriteSampleSheetTest(SimpleTestCase):
+
+    def setUp(self):
+        sample_sheet._template.clear()
+
+    def write(self, project):
+        f = io.BytesIO()
+        sample_sheet.write_sample_sheet(project, f)
+        f.seek(0)
+        return load_workbook(f)['Data']
+
+    def test_projects_do_not_share_values(self):
+        first = self.write({
+            'reference': 'A-1',
+            'projectlines': [_projectline('100', 'customer A secret')]})
+        self.assertEqual(first['F1'].value, 'A-1')
+        self.assertEqual(
+            first.cell(row=sample_sheet.SAMPLE_SHEET_FIRST_ROW,
+                       column=3).value, 'customer A secret')
+
+        second = self.write({'reference': 'B-1',
+                             'projectlines': [_projectline('200')]})
+        self.assertEqual(second['F1'].value, 'B-1')
+        values = [cell.value for row in second.iter_rows() for cell in row]
+        self.assertNotIn('customer A secret', values)
+        self.assertNotIn('A-1', values)
+
+    def test_package_holds_no_other_project_strings(self):
+        self.write({'reference': 'A-1',
+                    'projectlines': [_projectline('100', 'customer A secret')]})
+        f = io.BytesIO()
+        sample_sheet.write_sample_sheet(
+            {'reference': 'B-1', 'projectlines': [_projectline('200')]}, f)
+        with zipfile.ZipFile(f) as package:
+            content = b''.join(package.read(name)
+                               for name in package.namelist())
+        self.assertNotIn(b'customer A secret', content)
+
+    def test_values_are_escaped(self):
+        ws = self.write({'reference': 'A&B',
+                         'projectlines': [_projectline('100', ' <x> & y ')]})
+        self.assertEqual(ws['F1'].value, 'A&B')
+        self.assertEqual(
+            ws.cell(row=sample_sheet.SAMPLE_SHEET_FIRST_ROW,
+                    column=3).value, ' <x> & y ')
+
+    def test_validations_cover_every_row(self):
+        last_row = sample_sheet.SAMPLE_SHEET_FIRST_ROW + 999
+        ws = self.write({
+            'reference': 'A-1',
+            'projectlines': [_projectline(str(i)) for i in range(1000)]})
+        self.assertEqual(ws.cell(row=last_row, column=2).value, '999')
+        ranges = [r for v in ws.data_validations.dataValidation
+                  for r in v.sqref
+                  if r.min_row == sample_sheet.SAMPLE_SHEET_FIRST_ROW]
+        self.assertTrue(ranges)
+        self.assertTrue(all(r.max_row == last_row for r in ranges))
+
+
+def _sheet_csv(data_rows, header_last='Further details'):
+    width = len(sample_sheet.SAMPLE_SHEET_COL_ORDER)
+    header = ['Header'] * (width - 1) + [header_last]
+    lines = [[''] * width] * (sample_sheet.SAMPLE_SHEET_FIRST_ROW - 1)
+    lines[sample_sheet.SAMPLE_SHEET_HEADER_ROW - 1] = header
+    lines += data_rows
+    return '\n'.join(','.join(line) for line in lines).encode('utf-8')
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ReadSampleSheetTest(SimpleTestCase):
+
+    def test_reads_data_rows_padded_to_width(self):
+        rows = list(sample_sheet.read_sample_sheet(
+            _sheet_csv([['A1', '100', 'Sample 1'], ['A2', '101']]), 'csv'))
+        first = sample_sheet.SAMPLE_SHEET_FIRST_ROW - 1
+        self.assertEqual([row for row, values in rows], [first, first + 1])
+        self.assertEqual(rows[0][1][:4], ['A1', '100', 'Sample 1', ''])
+        self.assertEqual(len(rows[1][1]),
+                         len(sample_sheet.SAMPLE_SHEET_COL_ORDER))
+
+    def test_stops_at_blank_rows(self):
+        blank = [[''] * 3] * sample_sheet.SAMPLE_SHEET_BLANK_ROWS
+        rows = list(sample_sheet.read_sample_sheet(_sheet_csv(
+            [['A1', '100']] + [[''] * 3] * 5 + [['A2', '101']] + blank +
+            [['A3', '102']]), 'csv'))
+        self.assertEqual([values[1] for row, values in rows], ['100', '101'])
+
+    def test_rows_are_read_lazily(self):
+        read = []
+
+        header = [''] * (len(sample_sheet.SAMPLE_SHEET_COL_ORDER) - 1)
+        header.append('Further details')
+
+        def values():
+            for i, row in enumerate(
+                    [['']] * 2 + [header] + [['']] * 3 +
+                    [['A1', '100']] * 1000):
+                read.append(i)
+                yield sample_sheet._row_values(row)
+        with mock.patch.object(sample_sheet, '_iter_sheet_values',
+                               return_value=values()):
+            rows = sample_sheet.read_sample_sheet(b'', 'csv')
+            self.assertEqual(len(read), 3)
+            next(rows)
+        self.assertEqual(len(read), 7)
+
+    def test_bad_headers(self):
+        with self.assertRaises(sample_sheet.SampleSheetHeadersException):
+            sample_sheet.read_sample_sheet(
+                _sheet_csv([], header_last='Notes'), 'csv')
+
+    def test_unreadable_file(self):
+        with self.assertRaises(sample_sheet.SampleSheetFileException):
+            sample_sheet.read_sample_sheet(b'not a workbook', 'xlsx')
+
+    @mock.patch.object(sample_sheet, 'SAMPLE_SHEET_TEMPLATE_PATH',
+                       TEMPLATE_BASE_PATH)
+    def test_reads_written_xlsx(self):
+        sample_sheet._template.clear()
+        f = io.BytesIO()
+        sample_sheet.write_sample_sheet({
+            'reference': 'A-1',
+            'projectlines': [_projectline('100', 'Sample 1'),
+                             _projectline('101', 'Sample 2')]}, f)
+        rows = list(sample_sheet.read_sample_sheet(f.getvalue(), 'xlsx'))
+        self.assertEqual([values[1:3] for row, values in rows],
+                         [['100', 'Sample 1'], ['101', 'Sample 2']])
@@ -25,6 +25,9 @@ urlpatterns = [
     url(r'^projects/(?P<project_uuid>[-\w]{36})/permissions/$',
         views.project_permissions,
         name='project_permissions'),
+    url(r'^projects/(?P<project_uuid>[-\w]{36})/projectlines/$',
+        views.projectline_editor,
+        name='projectline_editor'),
     url(r'^projects/(?P<project_uuid>[-\w]{36})/projectlines/(?P<projectline_uuid>[-\w]{36})/update/$',
         views.projectline_update,
         name='projectline_update'),
@@ -34,6 +37,9 @@ urlpatterns = [
     url(r'^projects/(?P<project_uuid>[-\w]{36})/upload_sample_sheet/$',
         views.upload_sample_sheet,
         name='upload_sample_sheet'),
+    url(r'^projects/(?P<project_uuid>[-\w]{36})/upload_sample_sheet/(?P<job_id>[-\w]{36})/$',
+        views.upload_sample_sheet_status,
+        name='upload_sample_sheet_status'),
     url(r'^projects/email-link/$',
         views.project_email_link,
         name='project_email_link'),
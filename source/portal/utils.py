@@ -1,4 +1,5 @@
 import csv
+from collections import OrderedDict
 from datetime import datetime
 from pathlib import Path
 
@@ -11,6 +12,9 @@ from ipware.ip import get_real_ip
 from netaddr import IPNetwork, IPAddress
 from django_slack import slack_message
 
+from mngweb.caching import bump_dataset_version
+from mngweb.prefetch import write_prefetch
+from .lookups import environmental_sample_types, host_sample_types
 from .models import EnvironmentalSampleType, HostSampleType
 
 def handle_limsfm_request_exception(request, e):
@@ -89,6 +93,25 @@ def user_is_project_contact(user, project):
     return user_email.lower() in [c['email'].lower() for c in project['contacts']]
 
 
+PROJECTLINE_EDITOR_PAGE_SIZE = 96  # one plate of wells
+
+
+def projectline_editor_pages(projectlines):
+    """Split projectlines into pages for the projectline editor: one or more
+       per container plate, of at most PROJECTLINE_EDITOR_PAGE_SIZE lines.
+       Returns a list of (container_ref, page number, projectlines)"""
+    plates = OrderedDict()
+    for pl in projectlines:
+        plates.setdefault(pl.get('container_ref') or '', []).append(pl)
+    pages = []
+    for container_ref, lines in plates.items():
+        for i in range(0, len(lines), PROJECTLINE_EDITOR_PAGE_SIZE):
+            pages.append((container_ref,
+                          i // PROJECTLINE_EDITOR_PAGE_SIZE + 1,
+                          lines[i:i + PROJECTLINE_EDITOR_PAGE_SIZE]))
+    return pages
+
+
 def load_environmentalsampletype_data(file_path):
     """clear and reload EnvironmentalSampleType data from csv"""
     EnvironmentalSampleType.objects.all().delete()
@@ -96,6 +119,8 @@ def load_environmentalsampletype_data(file_path):
     for row in reader:
         obj = EnvironmentalSampleType(name=row['name'])
         obj.save()
+    bump_dataset_version(environmental_sample_types.dataset)
+    write_sampletype_prefetch()
 
 
 def load_hostsampletype_data(file_path):
@@ -105,6 +130,18 @@ def load_hostsampletype_data(file_path):
     for row in reader:
         obj = HostSampleType(name=row['name'])
         obj.save()
+    bump_dataset_version(host_sample_types.dataset)
+    write_sampletype_prefetch()
+
+
+def write_sampletype_prefetch():
+    """write the host and environmental sample type typeahead prefetch
+       files"""
+    write_prefetch('host_sample_types',
+                   HostSampleType.objects.values_list('name', flat=True))
+    write_prefetch('environmental_sample_types',
+                   EnvironmentalSampleType.objects.values_list('name',
+                                                               flat=True))
 
 
 def gmo_flag_to_file(project_reference, signer_name, gmo_flag):
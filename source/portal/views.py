@@ -1,33 +1,38 @@
+import os
 import requests
 
 from django.conf import settings
 from django.contrib import messages
 from django.core.mail import send_mail
 from django.core.urlresolvers import reverse
-from django.shortcuts import render
+from django.shortcuts import get_object_or_404, render
 from django.template.loader import render_to_string
-from django.http import HttpResponse, HttpResponseRedirect, JsonResponse, Http404
+from django.http import (FileResponse, HttpResponseRedirect,
+                         JsonResponse, Http404)
 from django.views.decorators.http import require_GET, require_POST, require_http_methods
 
 from allauth.account.decorators import verified_email_required
 from django_slack import slack_message
-from openpyxl.writer.excel import save_virtual_workbook
 from mngweb.decorators import require_ajax
+from mngweb.typeahead import (TypeaheadIndex, typeahead_cache,
+                              typeahead_response)
 
 from .decorators import check_project_permissions
 from .forms import (ProjectAcceptTermsForm, EmailLinkForm, ProjectEnaForm,
                     ProjectLineForm, ProjectPermissionsForm, UploadSampleSheetForm,
                     ProjectAddCollaboratorForm)
-from .models import EnvironmentalSampleType, HostSampleType
-from .sample_sheet import create_sample_sheet, parse_sample_sheet
+from .jobs import enqueue_sample_sheet_upload, upload_status_to_json
+from .lookups import environmental_sample_types, host_sample_types
+from .models import EnvironmentalSampleType, HostSampleType, SampleSheetUpload
+from .sample_sheet import create_sample_sheet
 from .services import (limsfm_email_project_links, limsfm_get_project,
-                       limsfm_update_projectline, limsfm_bulk_update_projectlines,
+                       limsfm_update_projectline,
                        limsfm_get_contact, limsfm_update_project, limsfm_project_add_contact,
                        limsfm_project_remove_contact)
 from .utils import (messages_to_json, json_messages_or_redirect,
                     request_should_post_to_slack, form_errors_to_json,
                     handle_limsfm_http_exception, handle_limsfm_request_exception,
-                    gmo_flag_to_file)
+                    gmo_flag_to_file, projectline_editor_pages)
 
 
 @require_GET
@@ -70,7 +75,8 @@ def project_detail(request, project_uuid):
         'project': project,
         'project_add_collaborator_form': ProjectAddCollaboratorForm(),
         'project_ena_form': ProjectEnaForm(initial=project),
-        'upload_sample_sheet_form': UploadSampleSheetForm()
+        'upload_sample_sheet_form': UploadSampleSheetForm(),
+        'projectline_pages': projectline_editor_pages(project['projectlines']),
     }
 
     if project['is_confidential'] or project['ena_title']:
@@ -246,6 +252,41 @@ def project_permissions(request, project_uuid):
         return JsonResponse(form_errors_to_json(request, project_ena_form), status=400)
 
 
+@require_GET
+@require_ajax
+@check_project_permissions
+def projectline_editor(request, project_uuid):
+    """Render the edit forms for one page (plate) of a project's lines"""
+    try:
+        project = limsfm_get_project(project_uuid)
+    except requests.HTTPError as e:
+        status = handle_limsfm_http_exception(request, e)
+        return JsonResponse(messages_to_json(request), status=status)
+    except requests.RequestException as e:
+        status = handle_limsfm_request_exception(request, e)
+        return JsonResponse(messages_to_json(request), status=status)
+    if project['meta_data_status'] != "Open":
+        raise Http404
+
+    plate = request.GET.get('plate', '')
+    try:
+        page = int(request.GET.get('page', 1))
+    except ValueError:
+        raise Http404
+    for container_ref, page_number, projectlines in projectline_editor_pages(
+            project['projectlines']):
+        if container_ref == plate and page_number == page:
+            break
+    else:
+        raise Http404
+
+    html = render_to_string(
+        'portal/project_includes/projectline_editor.html',
+        {'project': project, 'projectlines': projectlines},
+        request=request)
+    return JsonResponse({'plate': plate, 'page': page, 'html': html})
+
+
 @require_POST
 @require_ajax
 @check_project_permissions
@@ -310,10 +351,14 @@ def project_email_link(request):
 @require_GET
 @check_project_permissions
 def download_sample_sheet(request, uuid):
-    wb = create_sample_sheet(uuid)
-    response = HttpResponse(
-        content=save_virtual_workbook(wb),
+    sample_sheet = create_sample_sheet(uuid)
+    sample_sheet.seek(0, os.SEEK_END)
+    content_length = sample_sheet.tell()
+    sample_sheet.seek(0)
+    response = FileResponse(
+        sample_sheet,
         content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    response['Content-Length'] = content_length
     response['Content-Disposition'] = 'attachment; filename=microbesng_sample_sheet.xlsx'
     return response
 
@@ -328,95 +373,43 @@ def upload_sample_sheet(request, uuid):
         messages.error(request, "No file uploaded.")
         return json_messages_or_redirect(request, redirect_url, status=400)
 
-    filehandle = request.FILES['file']
+    # Validation and import happen in the runsamplesheetworker process
+    upload = enqueue_sample_sheet_upload(uuid, request.FILES['file'])
 
-    try:
-        sheet = filehandle.get_sheet()
-    except NotImplementedError as e:
-        messages.error(request, "Invalid file uploaded. Please download the Excel template for your project.")
-        return json_messages_or_redirect(request, redirect_url, status=400)
+    if request.is_ajax():
+        json_data = upload_status_to_json(upload)
+        json_data['status_url'] = reverse(
+            'upload_sample_sheet_status', args=[uuid, upload.pk])
+        json_data['redirect_url'] = redirect_url
+        return JsonResponse(json_data, status=202)
+    messages.info(request, "Your sample sheet is being processed. "
+                           "Please reload this page in a few minutes.")
+    return HttpResponseRedirect(redirect_url)
 
-    # Check headers
-    if not (
-        len(sheet.row[2]) == 18 and
-        sheet[2, 17] == 'Further details'
-    ):
-        messages.error(request, "Invalid sample sheet headers. "
-                                "Have you used the correct template?")
-        return json_messages_or_redirect(request, redirect_url, status=400)
 
-    # Get project, index lines by sample ref
-    try:
-        project = limsfm_get_project(uuid)
-    except requests.HTTPError as e:
-        status = handle_limsfm_http_exception(request, e)
-        return JsonResponse(messages_to_json(request), status=status)
-    except requests.RequestException as e:
-        status = handle_limsfm_request_exception(request, e)
-        return JsonResponse(messages_to_json(request), status=status)
+@require_GET
+@check_project_permissions
+def upload_sample_sheet_status(request, uuid, job_id):
+    upload = get_object_or_404(SampleSheetUpload, pk=job_id, project_uuid=uuid)
+    json_data = upload_status_to_json(upload)
+    json_data['redirect_url'] = reverse('project_detail', args=[uuid])
+    return JsonResponse(json_data)
 
-    # Parse sample sheet
-    parsed = parse_sample_sheet(project, sheet)
 
-    # Errors found
-    errors = parsed['errors']
-    if errors:
-        for e in errors[0:10]:  # Only report first 10
-            m = ("Error on row %(row)d: %(message)s" %
-                 {'row': e['row'] + 1, 'message': e['message']})
-            messages.error(request, m)
-        return json_messages_or_redirect(request, redirect_url, status=400)
+host_sample_type_index = TypeaheadIndex(
+    host_sample_types.dataset,
+    lambda: HostSampleType.objects.values_list('name', flat=True))
 
-    # Bulk update via API
-    try:
-        limsfm_bulk_update_projectlines(uuid, parsed['updates'])
-    except requests.HTTPError as e:
-        status = handle_limsfm_http_exception(request, e)
-    except requests.RequestException as e:
-        status = handle_limsfm_request_exception(request, e)
-    else:
-        status = 200
-        update_count = len(parsed['updates'])
-        slack_message(
-            'portal/slack/limsfm_upload_sample_sheet_success.slack',
-            {'project': project, 'update_count': update_count})
-        messages.success(
-            request,
-            "%(count)d rows successfully imported." %
-            {'count': update_count}
-        )
-
-    # Return
-    if request.is_ajax():
-        if status == 200:
-            json_data = {'redirect_url': redirect_url}
-        else:
-            json_data = messages_to_json(request)
-        return JsonResponse(json_data, status=status)
-    else:
-        return HttpResponseRedirect(redirect_url)
+environmental_sample_type_index = TypeaheadIndex(
+    environmental_sample_types.dataset,
+    lambda: EnvironmentalSampleType.objects.values_list('name', flat=True))
 
 
+@typeahead_cache(host_sample_type_index)
 def hostsampletype_typeahead(request):
-    q = request.GET.get('q', '')
-    if q:
-        matches = (HostSampleType.objects
-                   .filter(name__icontains=q)
-                   .values_list('name', flat=True)[:10])
-    else:
-        matches = HostSampleType.objects.all().values_list('name', flat=True)
-    data = list(matches)
-    return JsonResponse(data, safe=False)
+    return typeahead_response(request, host_sample_type_index)
 
 
+@typeahead_cache(environmental_sample_type_index)
 def environmentalsampletype_typeahead(request):
-    q = request.GET.get('q', '')
-    if q:
-        matches = (EnvironmentalSampleType.objects
-                   .filter(name__icontains=q)
-                   .values_list('name', flat=True)[:10])
-    else:
-        matches = EnvironmentalSampleType.objects.all().\
-            values_list('name', flat=True)
-    data = list(matches)
-    return JsonResponse(data, safe=False)
+    return typeahead_response(request, environmental_sample_type_index)
@@ -2,10 +2,10 @@ import json
 
 from django import template
 from django.conf import settings
-from django.core.cache import cache
 from django.utils.safestring import mark_safe
 from requests import RequestException
 
+from mngweb.caching import cached_computation
 from portal.services import limsfm_get_project_countries_served
 
 
@@ -15,9 +15,9 @@ register = template.Library()
 @register.inclusion_tag('projectmap/tags/map_countries_served.html')
 def map_countries_served(container_id='projectmap_container', arc=False, height=None,
                          projection='equirectangular', responsive=False):
-    countries = cache.get_or_set(
+    countries = cached_computation(
         'projectmap_countries_served',
-        limsfm_get_project_countries_served(),
+        limsfm_get_project_countries_served,
         settings.LIMS_STATS_CACHE_TIMEOUT
     )
 
@@ -45,9 +45,9 @@ def map_countries_served(container_id='projectmap_container', arc=False, height=
 @register.simple_tag
 def countries_served():
     try:
-        return cache.get_or_set(
+        return cached_computation(
             'projectmap_countries_served',
-            limsfm_get_project_countries_served(),
+            limsfm_get_project_countries_served,
             settings.LIMS_STATS_CACHE_TIMEOUT
         )
     except RequestException as e:
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from taxon.utils import load_ncbi_taxdump
+
+
+class Command(BaseCommand):
+    help = """Loads an NCBI taxdump (names.dmp/nodes.dmp, as a directory or
+              taxdump.tar.gz) into the local taxonomy mirror used to
+              validate taxon ids"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+
+    def handle(self, *args, **options):
+        try:
+            load_ncbi_taxdump(options['path'])
+        except Exception as e:
+            raise CommandError('An exception occurred: %s' % e)
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                "Successfully loaded NCBI taxonomy"))
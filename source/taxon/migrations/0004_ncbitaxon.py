@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('taxon', '0003_auto_20160905_1120'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NcbiTaxon',
+            fields=[
+                ('taxid', models.IntegerField(primary_key=True, serialize=False)),
+                ('parent_taxid', models.IntegerField(null=True)),
+                ('rank', models.CharField(blank=True, max_length=50)),
+                ('name', models.CharField(max_length=255)),
+            ],
+        ),
+    ]
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+from mngweb import fts
+
+
+def create_taxon_fts(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        if fts.fts5_available(cursor):
+            fts.create_shadow_table(cursor, 'taxon_taxon')
+
+
+def drop_taxon_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        fts.drop_shadow_table(cursor, 'taxon_taxon')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('taxon', '0004_ncbitaxon'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_taxon_fts, drop_taxon_fts),
+    ]
@@ -3,6 +3,11 @@ from __future__ import unicode_literals
 from django.db import models
 
 
+# dataset version name, bumped by update_taxonomy()
+TAXA_DATASET = 'taxa'
+PROKARYOTE_DATA_SETS = ['Prokaryotes', 'Other']
+
+
 class Taxon(models.Model):
     fm_id = models.IntegerField()
     name = models.CharField(max_length=255)
@@ -14,3 +19,23 @@ class Taxon(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class NcbiTaxon(models.Model):
+    """Local mirror of the NCBI taxonomy (loaded from a taxdump archive with
+       the loadtaxdump management command)"""
+    taxid = models.IntegerField(primary_key=True)
+    parent_taxid = models.IntegerField(null=True)
+    rank = models.CharField(max_length=50, blank=True)
+    name = models.CharField(max_length=255)
+
+    def __str__(self):
+        return self.name
+
+    def to_ebi_entry(self):
+        """Return the taxon in the shape of an EBI search taxonomy entry"""
+        return {
+            'id': str(self.taxid),
+            'source': 'taxonomy',
+            'fields': {'name': [self.name]},
+        }
@@ -25,6 +25,21 @@
     return rankQueries.join(' OR ');
   }
 
+  var ebiPendingRequest = null;
+
+  // Abort the request for an earlier query, whose results Bloodhound
+  // would discard anyway, when a new (debounced) query is sent
+  function ebiTransport (settings, onSuccess, onError) {
+    var request;
+    if (ebiPendingRequest) ebiPendingRequest.abort();
+    request = ebiPendingRequest = $.ajax(settings)
+      .done(onSuccess)
+      .fail(onError)
+      .always(function () {
+        if (ebiPendingRequest === request) ebiPendingRequest = null;
+      });
+  }
+
   typeahead.ebiTaxonomyBloodhound = new Bloodhound({
     datumTokenizer: function(d) {
       return Bloodhound.tokenizers.whitespace(d.fields.name);
@@ -32,8 +47,12 @@
     queryTokenizer: Bloodhound.tokenizers.whitespace,
     remote: {
       url: '/taxon/ebi_typeahead/',
+      rateLimitBy: 'debounce',
+      rateLimitWait: 300,
+      transport: ebiTransport,
       prepare: function (query, settings) {
         settings.data = {
+          q: query,
           query: ebiPrepareRemoteQuery(query),
           fields: 'name',
           format: 'json',
@@ -47,26 +66,33 @@
     }
   });
 
-  // Legacy bloodhound instances for internal taxonomy
+  // Legacy bloodhound instances for internal taxonomy. Without a static
+  // prefetch file, the prefetch only holds the first page of names; the
+  // rest are found remotely.
   typeahead.taxonomy = new Bloodhound({
     datumTokenizer: Bloodhound.tokenizers.whitespace,
     queryTokenizer: Bloodhound.tokenizers.whitespace,
-    prefetch: '/taxon/typeahead/'
+    prefetch: typeahead.prefetchUrl('taxa', '/taxon/typeahead/'),
+    remote: {
+      url: '/taxon/typeahead/?q=%QUERY',
+      wildcard: '%QUERY'
+    }
   });
 
   typeahead.taxonomyProkaryotes = new Bloodhound({
     datumTokenizer: Bloodhound.tokenizers.whitespace,
     queryTokenizer: Bloodhound.tokenizers.whitespace,
-    prefetch: '/taxon/prokaryotes/typeahead/'
+    prefetch: typeahead.prefetchUrl('taxa_prokaryotes',
+                                    '/taxon/prokaryotes/typeahead/'),
+    remote: {
+      url: '/taxon/prokaryotes/typeahead/?q=%QUERY',
+      wildcard: '%QUERY'
+    }
   });
 
-  mngweb.typeahead = typeahead;
-
-  /*
-  jQuery document ready:
-  */
-  $(document).ready(function () {
-    $('.ebi-taxonomy-typeahead input').typeahead({
+  // Also called for forms loaded after the page, e.g. the projectline editor
+  typeahead.initEbiTaxonomyTypeaheads = function (context) {
+    $(context).find('.ebi-taxonomy-typeahead input').typeahead({
       hint: false,
       highlight: true,
       minLength: 3
@@ -87,6 +113,15 @@
         }
       }
     });
+  };
+
+  mngweb.typeahead = typeahead;
+
+  /*
+  jQuery document ready:
+  */
+  $(document).ready(function () {
+    typeahead.initEbiTaxonomyTypeaheads(document);
 
     $('.taxon-typeahead input').typeahead({
       hint: true,
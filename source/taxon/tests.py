@@ -0,0 +1,126 @@
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.test import TestCase, override_settings
+
+from mngweb import fts
+from mngweb.caching import bump_dataset_version
+from . import views
+from .models import TAXA_DATASET, NcbiTaxon, Taxon
+from .utils import _open_dmp, load_ncbi_taxdump
+
+
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'taxon-tests',
+    }
+}
+
+
+NAMES_DMP = (
+    '1\t|\troot\t|\t\t|\tscientific name\t|\n'
+    '562\t|\tEscherichia coli\t|\t\t|\tscientific name\t|\n'
+    '562\t|\tBacillus coli\t|\t\t|\tsynonym\t|\n'
+)
+NODES_DMP = (
+    '1\t|\t1\t|\tno rank\t|\n'
+    '562\t|\t1\t|\tspecies\t|\n'
+)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class TaxdumpTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.archive = os.path.join(self.directory, 'taxdump.tar.gz')
+        with tarfile.open(self.archive, 'w:gz') as archive:
+            for name, content in [('names.dmp', NAMES_DMP),
+                                  ('nodes.dmp', NODES_DMP)]:
+                data = content.encode('utf-8')
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                archive.addfile(info, io.BytesIO(data))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_load_from_archive(self):
+        load_ncbi_taxdump(self.archive)
+        taxon = NcbiTaxon.objects.get(taxid=562)
+        self.assertEqual(taxon.name, 'Escherichia coli')
+        self.assertEqual(taxon.rank, 'species')
+        self.assertEqual(taxon.parent_taxid, 1)
+        self.assertEqual(NcbiTaxon.objects.count(), 2)
+
+    def test_open_dmp_closes_archive(self):
+        opened = []
+        real_open = tarfile.open
+
+        def tar_open(*args, **kwargs):
+            opened.append(real_open(*args, **kwargs))
+            return opened[-1]
+
+        with mock.patch('tarfile.open', tar_open):
+            with _open_dmp(self.archive, 'names.dmp') as f:
+                self.assertTrue(f.read())
+        self.assertTrue(opened[0].closed)
+        self.assertTrue(f.closed)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class TaxonTypeaheadTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        fts._existing.clear()
+        for i, name in enumerate(['Escherichia coli', 'Bacillus subtilis',
+                                  'Staphylococcus aureus', 'Homo sapiens']):
+            Taxon.objects.create(fm_id=i, name=name,
+                                 data_set='Other' if i < 3 else 'Eukaryotes')
+        self.url = reverse('taxon_typeahead')
+
+    def test_empty_query_pages_from_database(self):
+        self.assertTrue(fts.shadow_table_exists(views.TAXA_TABLE))
+        with mock.patch.object(views.taxon_index, 'build',
+                               side_effect=AssertionError):
+            first = self.client.get(self.url, {'limit': 2})
+            last = self.client.get(self.url, {'limit': 2, 'cursor': 2})
+        self.assertEqual(first.json(), ['Bacillus subtilis',
+                                        'Escherichia coli'])
+        self.assertIn('cursor=2', first['Link'])
+        self.assertEqual(last.json(), ['Homo sapiens',
+                                       'Staphylococcus aureus'])
+        self.assertFalse(last.has_header('Link'))
+
+    def test_empty_query_pages_prokaryotes(self):
+        response = self.client.get(reverse('taxon_prokaryotes_typeahead'))
+        self.assertEqual(response.json(), [
+            'Bacillus subtilis', 'Escherichia coli', 'Staphylococcus aureus'])
+
+    def test_no_validators_before_sync(self):
+        response = self.client.get(self.url, {'q': 'coli'})
+        self.assertEqual(response.json(), ['Escherichia coli'])
+        self.assertFalse(response.has_header('ETag'))
+        self.assertFalse(response.has_header('Last-Modified'))
+
+    def test_etag_follows_sync_version(self):
+        bump_dataset_version(TAXA_DATASET)
+        response = self.client.get(self.url, {'q': 'coli'})
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+        self.assertEqual(self.client.get(
+            self.url, {'q': 'coli'}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        bump_dataset_version(TAXA_DATASET)
+        response = self.client.get(self.url, {'q': 'coli'},
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
@@ -1,7 +1,18 @@
+import io
+import os
+import tarfile
+from contextlib import contextmanager
+
+from django.db import connection, transaction
 from django.utils import timezone
 
+from mngweb.caching import bump_dataset_version
+from mngweb.prefetch import write_prefetch
 from portal.services import limsfm_get_taxonomy
-from .models import Taxon
+from .models import PROKARYOTE_DATA_SETS, TAXA_DATASET, NcbiTaxon, Taxon
+
+
+TAXDUMP_BATCH_SIZE = 10000
 
 
 def update_taxonomy():
@@ -31,6 +42,82 @@ def update_taxonomy():
     delete_set = Taxon.objects.filter(updated__lt=start_time)
     deleted_count = len(delete_set)
     delete_set.delete()
+    bump_dataset_version(TAXA_DATASET)
+    write_taxonomy_prefetch()
 
     print("Taxonomy update completed. %d created, %d updated, %d deleted." %
           (created_count, updated_count, deleted_count))
+
+
+def write_taxonomy_prefetch():
+    """write the taxon typeahead prefetch files"""
+    taxa = Taxon.objects.values_list('name', flat=True)
+    write_prefetch('taxa', taxa)
+    write_prefetch('taxa_prokaryotes',
+                   taxa.filter(data_set__in=PROKARYOTE_DATA_SETS))
+
+
+def _iter_dmp(fileobj):
+    """Yield the fields of each row of an NCBI taxdump .dmp file"""
+    for line in io.TextIOWrapper(fileobj, encoding='utf-8'):
+        if line.endswith('\t|\n'):
+            line = line[:-3]
+        yield line.split('\t|\t')
+
+
+@contextmanager
+def _open_dmp(path, filename):
+    """Open filename from a taxdump directory or .tar.gz archive, closing
+       it (and the archive) on exit"""
+    if os.path.isdir(path):
+        with open(os.path.join(path, filename), 'rb') as f:
+            yield f
+        return
+    with tarfile.open(path, 'r:*') as archive:
+        f = archive.extractfile(filename)
+        try:
+            yield f
+        finally:
+            f.close()
+
+
+def load_ncbi_taxdump(path):
+    """Replace the local NCBI taxonomy mirror with the contents of a taxdump
+       (names.dmp and nodes.dmp, in a directory or taxdump.tar.gz)"""
+    table = connection.ops.quote_name(NcbiTaxon._meta.db_table)
+    insert_sql = ('INSERT INTO %s (taxid, parent_taxid, rank, name) '
+                  'VALUES (%%s, NULL, \'\', %%s)' % table)
+    update_sql = ('UPDATE %s SET parent_taxid = %%s, rank = %%s '
+                  'WHERE taxid = %%s' % table)
+
+    with transaction.atomic():
+        print("Clearing local NCBI taxonomy...")
+        NcbiTaxon.objects.all().delete()
+
+        cursor = connection.cursor()
+        print("Loading scientific names...")
+        name_count = 0
+        batch = []
+        with _open_dmp(path, 'names.dmp') as f:
+            for taxid, name, unique_name, name_class in _iter_dmp(f):
+                if name_class != 'scientific name':
+                    continue
+                batch.append((int(taxid), name[:255]))
+                if len(batch) >= TAXDUMP_BATCH_SIZE:
+                    cursor.executemany(insert_sql, batch)
+                    name_count += len(batch)
+                    batch = []
+        cursor.executemany(insert_sql, batch)
+        name_count += len(batch)
+
+        print("Loading taxonomy tree...")
+        batch = []
+        with _open_dmp(path, 'nodes.dmp') as f:
+            for fields in _iter_dmp(f):
+                batch.append((int(fields[1]), fields[2], int(fields[0])))
+                if len(batch) >= TAXDUMP_BATCH_SIZE:
+                    cursor.executemany(update_sql, batch)
+                    batch = []
+        cursor.executemany(update_sql, batch)
+
+    print("NCBI taxonomy load completed. %d taxa loaded." % name_count)
@@ -1,54 +1,95 @@
 import requests
 
 from django.core.cache import cache
+from django.db import connection
 from django.http import JsonResponse
 
-from .models import Taxon
-from portal.ebi_services import ebi_search_taxonomy_by_id
+from mngweb import fts
+from mngweb.typeahead import (TypeaheadIndex, queryset_page,
+                              typeahead_cache, typeahead_response)
+from .models import PROKARYOTE_DATA_SETS, TAXA_DATASET, Taxon
+from portal.ebi_services import (NoTaxonFoundException,
+                                 ebi_search_taxonomy_by_id,
+                                 ebi_typeahead_search)
 
 
+TAXA_TABLE = Taxon._meta.db_table
+
+# Fallbacks for databases without an FTS5 shadow table
+taxon_index = TypeaheadIndex(
+    TAXA_DATASET,
+    lambda: Taxon.objects.values_list('name', flat=True),
+    warm=lambda: not fts.shadow_table_exists(TAXA_TABLE))
+
+taxon_prokaryotes_index = TypeaheadIndex(
+    TAXA_DATASET,
+    lambda: (Taxon.objects
+             .filter(data_set__in=PROKARYOTE_DATA_SETS)
+             .values_list('name', flat=True)),
+    warm=lambda: not fts.shadow_table_exists(TAXA_TABLE))
+
+
+def taxon_fts_search(q, limit):
+    with connection.cursor() as cursor:
+        return fts.search(cursor, TAXA_TABLE, q, limit)
+
+
+def taxon_prokaryotes_fts_search(q, limit):
+    with connection.cursor() as cursor:
+        return fts.search(cursor, TAXA_TABLE, q, limit,
+                          where='AND c.data_set IN (%s, %s)',
+                          params=PROKARYOTE_DATA_SETS)
+
+
+def taxon_page(cursor, size):
+    return queryset_page(
+        Taxon.objects.order_by('name').values_list('name', flat=True),
+        cursor, size)
+
+
+def taxon_prokaryotes_page(cursor, size):
+    return queryset_page(
+        Taxon.objects
+        .filter(data_set__in=PROKARYOTE_DATA_SETS)
+        .order_by('name').values_list('name', flat=True),
+        cursor, size)
+
+
+@typeahead_cache(taxon_index)
 def taxon_typeahead(request):
-    q = request.GET.get('q', '')
-    if q:
-        matches = (Taxon.objects
-                   .filter(name__icontains=q)
-                   .values_list('name', flat=True)[:10])
-    else:
-        matches = Taxon.objects.all().values_list('name', flat=True)
-    data = list(matches)
-    return JsonResponse(data, safe=False)
+    search = page = None
+    if fts.shadow_table_exists(TAXA_TABLE):
+        search, page = taxon_fts_search, taxon_page
+    return typeahead_response(request, taxon_index, search, page)
 
 
+@typeahead_cache(taxon_prokaryotes_index)
 def taxon_prokaryotes_typeahead(request):
-    q = request.GET.get('q', '')
-    matches = Taxon.objects.filter(data_set__in=['Prokaryotes', 'Other'])
-    if q:
-        matches = (matches
-                   .filter(name__icontains=q)
-                   .values_list('name', flat=True)[:10])
-    else:
-        matches = matches.values_list('name', flat=True)
-    data = list(matches)
-    return JsonResponse(data, safe=False)
+    search = page = None
+    if fts.shadow_table_exists(TAXA_TABLE):
+        search, page = taxon_prokaryotes_fts_search, taxon_prokaryotes_page
+    return typeahead_response(request, taxon_prokaryotes_index, search, page)
 
 
 def ebi_typeahead(request):
     try:
-        response = requests.get('https://www.ebi.ac.uk/ebisearch/ws/rest/taxonomy', params=request.GET)
-    except requests.RequestException:
-        JsonResponse({'error': 'An unspecified error occurred.'}, status=500)
+        json = ebi_typeahead_search(request.GET)
+    except requests.Timeout:
+        return JsonResponse({'error': 'The EBI search timed out.'}, status=504)
+    except (requests.RequestException, ValueError):
+        return JsonResponse({'error': 'An unspecified error occurred.'}, status=500)
     else:
-        json = response.json()
         return JsonResponse(json)
 
 
 def ebi_taxonomy_detail(request, taxid):
     try:
         json = ebi_search_taxonomy_by_id(taxid)
-    except requests.RequestException:
-        JsonResponse({'error': 'An unspecified error occurred.'}, status=500)
+    except NoTaxonFoundException:
+        json = None
+    except (requests.RequestException, ValueError):
+        return JsonResponse({'error': 'An unspecified error occurred.'}, status=500)
+    if json:
+        return JsonResponse(json[0])
     else:
-        if json:
-            return JsonResponse(json[0])
-        else:
-            return JsonResponse({'error': 'Taxid {} not found'.format(taxid)}, status=404)
+        return JsonResponse({'error': 'Taxid {} not found'.format(taxid)}, status=404)